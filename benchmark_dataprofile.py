@@ -0,0 +1,286 @@
+import argparse
+import io
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_matching import RssSampler, peak_rss_mb, current_rss_mb, git_revision
+
+# -------------------------------------------------------------------
+# Benchmark harness for the dataprofile app
+#
+#   python benchmark_dataprofile.py --out profile_bench.json
+#   python benchmark_dataprofile.py --shapes wide --compare profile_bench.json
+#   python benchmark_dataprofile.py --scale 0.1        # quick run
+#
+# Runs the app's profiling functions headlessly (dataprofile is imported
+# without a Streamlit server, so no upload arrives and the page body is
+# skipped; cached functions are called through __wrapped__ so every
+# measurement does the real work). CSVs are generated once per shape;
+# every (shape, stage) run happens in a fresh worker process that runs the
+# stages it depends on untimed, then times the stage while a thread
+# samples RSS for the stage's own peak.
+# -------------------------------------------------------------------
+
+# rows, and how many columns of each kind
+shapes = {
+    "tall": {"rows": 1_000_000, "numeric": 7, "categorical": 2, "dates": 0, "timestamps": 0, "text": 1, "null_rate": 0.0},
+    "wide": {"rows": 10_000, "numeric": 480, "categorical": 15, "dates": 0, "timestamps": 0, "text": 5, "null_rate": 0.0},
+    "mixed": {"rows": 200_000, "numeric": 8, "categorical": 6, "dates": 3, "timestamps": 1, "text": 3, "null_rate": 0.1},
+}
+
+all_stages = ["infer", "parse", "profile", "profile_approx", "correlation", "charts", "excel", "bundle", "context"]
+
+# stage -> stages whose results it needs
+stage_needs = {
+    "infer": [],
+    "parse": ["infer"],
+    "profile": ["infer"],
+    "profile_approx": ["infer"],
+    "correlation": ["infer", "parse", "profile"],
+    "charts": ["infer", "parse", "profile", "correlation"],
+    "excel": ["infer", "parse", "profile", "correlation"],
+    "bundle": ["infer", "parse", "profile", "correlation"],
+    "context": ["infer", "parse", "profile", "correlation"],
+}
+
+category_levels = np.array([
+    "Philadelphia", "Allegheny", "Montgomery", "Bucks", "Delaware", "Lancaster",
+    "Chester", "York", "Berks", "Lehigh", "Westmoreland", "Luzerne",
+], dtype=object)
+
+
+# -------------------------------------------------------------------
+# Synthetic CSVs
+# -------------------------------------------------------------------
+
+def generate_frame(rows, numeric=8, categorical=2, dates=0, timestamps=0, text=1, null_rate=0.0, seed=0):
+    """
+    Seeded synthetic table: an ID column, correlated numeric columns (float
+    and int), low-cardinality categoricals, m/d/Y date columns (text to the
+    reader), ISO date-time columns (parsed by the pyarrow reader itself) and
+    high-cardinality text, with a null_rate share of each non-ID column blank.
+    """
+    rng = np.random.default_rng(seed)
+    columns = {"record_id": np.arange(rows)}
+
+    # numeric columns share a few latent factors, so some pairs correlate
+    factors = rng.normal(size=(rows, 4)).astype(np.float32)
+    for i in range(numeric):
+        values = factors @ rng.normal(size=4).astype(np.float32) + rng.normal(size=rows).astype(np.float32)
+        columns[f"num_{i}"] = np.round(values * 100, 2) if i % 2 else np.round(values * 10).astype(np.int64)
+    for i in range(categorical):
+        columns[f"cat_{i}"] = category_levels[rng.integers(0, 3 + i % 10, rows)]
+    for i in range(dates):
+        days = rng.integers(0, 365 * 5, rows).astype("timedelta64[D]")
+        columns[f"date_{i}"] = pd.to_datetime(np.datetime64("2020-01-01") + days).strftime("%m/%d/%Y")
+    for i in range(timestamps):
+        seconds = rng.integers(0, 86_400 * 365 * 5, rows).astype("timedelta64[s]")
+        columns[f"ts_{i}"] = pd.to_datetime(np.datetime64("2020-01-01T00:00:00") + seconds).strftime("%Y-%m-%d %H:%M:%S")
+    for i in range(text):
+        columns[f"text_{i}"] = pd.Series(rng.integers(0, rows * 10, rows)).map("note-{:x}".format).to_numpy()
+
+    df = pd.DataFrame(columns)
+    if null_rate:
+        for col in df.columns[1:]:
+            df[col] = df[col].where(rng.random(rows) >= null_rate)
+    return df
+
+
+def shape_spec(shape, scale=1.0):
+    spec = dict(shapes[shape])
+    spec["rows"] = max(int(spec["rows"] * scale), 100)
+    return spec
+
+
+def ensure_csv(shape, data_dir, scale=1.0, seed=0):
+    """Path of the shape's CSV, generating it on first use."""
+    spec = shape_spec(shape, scale)
+    # the column mix is part of the name, so a changed shape never reuses an old file
+    kinds = "-".join(str(spec[k]) for k in ("numeric", "categorical", "dates", "timestamps", "text"))
+    path = os.path.join(data_dir, f"{shape}-{spec['rows']}-{kinds}-{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        generate_frame(seed=seed, **spec).to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    return path
+
+
+# -------------------------------------------------------------------
+# Measurement (runs inside a worker process)
+# -------------------------------------------------------------------
+
+def import_dataprofile():
+    """Import the app module without a Streamlit server (the page body is skipped)."""
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    import dataprofile
+    return dataprofile
+
+
+def run_step(dp, stage, state):
+    """Run one stage of the app's pipeline, storing its result in state."""
+    upload, columns = state["upload"], state.get("columns")
+    if stage == "infer":
+        state["types"], state["date_formats"] = dp.infer_upload_types.__wrapped__("bench", upload)
+        state["columns"] = tuple(state["types"])
+    elif stage == "parse":
+        state["df"], _ = dp.load_upload.__wrapped__("bench", columns, upload, state["types"], state["date_formats"])
+    elif stage in ("profile", "profile_approx"):
+        mode = "exact" if stage == "profile" else "approx"
+        state[stage] = dp.profile_upload(
+            dp.upload_stream(upload), mode,
+            usecols=list(columns), **dp.date_read_kwargs(state["date_formats"], columns),
+        )
+    elif stage == "correlation":
+        num_columns = tuple(state["profile"]["num_columns"])
+        state["correlation"] = dp.correlation_profile.__wrapped__("bench", columns, num_columns, state["df"])
+    elif stage == "charts":
+        # what opening every EDA section shows: its first page, plus the heatmap
+        pngs = []
+        for _, specs in dp.eda_sections(state["profile"]):
+            pngs += dp.chart_pngs("bench", columns, specs[:dp.EDA_PAGE_SIZE], state["df"])
+        if state["correlation"] is not None:
+            pngs.append(dp.correlation_png.__wrapped__("bench", columns, 0.3, state["correlation"]))
+        state["charts"] = len(pngs)
+    elif stage == "excel":
+        state["excel"] = dp.excel_bytes(dp.profile_tables(state["profile"], state["correlation"]))
+    elif stage == "bundle":
+        state["bundle"] = dp.bundle_bytes(dp.profile_tables(state["profile"], state["correlation"]), "parquet")
+    elif stage == "context":
+        state["context"] = dp.dataset_context(state["profile"], state["correlation"], dp.PROMPT_TOKEN_BUDGET)
+    else:
+        raise ValueError(f"unknown stage: {stage}")
+
+
+def run_stage(stage, shape, csv_path):
+    """Load the CSV as an upload, run the stages `stage` needs, then time `stage`."""
+    dp = import_dataprofile()
+    with open(csv_path, "rb") as f:
+        state = {"upload": io.BytesIO(f.read())}
+    for needed in stage_needs[stage]:
+        run_step(dp, needed, state)
+
+    rss_before = current_rss_mb()
+    with RssSampler() as sampler:
+        start = time.perf_counter()
+        run_step(dp, stage, state)
+        wall = time.perf_counter() - start
+
+    n_rows = sum(1 for _ in io.TextIOWrapper(dp.upload_stream(state["upload"]), encoding="utf-8")) - 1
+    return {
+        "shape": shape,
+        "stage": stage,
+        "rows": n_rows,
+        "cols": len(state["columns"]) if "columns" in state else None,
+        "csv_mb": round(os.path.getsize(csv_path) / (1024 * 1024), 1),
+        "wall_s": round(wall, 4),
+        "rows_per_s": round(n_rows / wall, 1) if wall > 0 else None,
+        "rss_before_mb": round(rss_before, 1),
+        "stage_peak_mb": round(sampler.peak_mb, 1),
+        "stage_extra_mb": round(sampler.peak_mb - rss_before, 1),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def run_in_worker(stage, shape, csv_path):
+    """Run one measurement in a fresh interpreter and return its result dict."""
+    spec = json.dumps({"stage": stage, "shape": shape, "csv": csv_path})
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", spec],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# -------------------------------------------------------------------
+# Baselines
+# -------------------------------------------------------------------
+
+def compare_results(baseline, current, tolerance=0.2):
+    """
+    Compare two result documents on (shape, stage). A run is a regression
+    when wall time or the stage's peak RSS grew by more than `tolerance`
+    (0.2 = 20%). Returns a DataFrame with one row per matching run.
+    """
+    key = ["shape", "stage"]
+    base = pd.DataFrame(baseline["results"]).set_index(key)
+    cur = pd.DataFrame(current["results"]).set_index(key)
+    both = base[["wall_s", "stage_peak_mb"]].join(
+        cur[["wall_s", "stage_peak_mb"]], lsuffix="_base", rsuffix="_new", how="inner"
+    )
+    both["wall_ratio"] = both["wall_s_new"] / both["wall_s_base"]
+    both["rss_ratio"] = both["stage_peak_mb_new"] / both["stage_peak_mb_base"]
+    both["regression"] = (both["wall_ratio"] > 1 + tolerance) | (both["rss_ratio"] > 1 + tolerance)
+    return both.reset_index()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the dataprofile app's profiling stages.")
+    parser.add_argument("--shapes", nargs="+", default=list(shapes), choices=list(shapes))
+    parser.add_argument("--stages", nargs="+", default=all_stages, choices=all_stages)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every shape's row count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".bench_data"))
+    parser.add_argument("--label", default=None, help="name stored with the results (default: git revision)")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        spec = json.loads(args.worker)
+        result = run_stage(spec["stage"], spec["shape"], spec["csv"])
+        print(json.dumps(result))
+        return 0
+
+    doc = {
+        "label": args.label or git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "scale": args.scale,
+        "seed": args.seed,
+        "shapes": {shape: shape_spec(shape, args.scale) for shape in args.shapes},
+        "results": [],
+    }
+
+    for shape in args.shapes:
+        csv_path = ensure_csv(shape, args.data_dir, args.scale, args.seed)
+        for stage in args.stages:
+            result = run_in_worker(stage, shape, csv_path)
+            doc["results"].append(result)
+            print(
+                f"{shape:<6} {stage:<15} rows={result['rows']:>10,} cols={result['cols']:>4}  "
+                f"wall={result['wall_s']:>9.3f}s  stage_peak={result['stage_peak_mb']:>8.1f}MB  "
+                f"(+{result['stage_extra_mb']:.1f}MB)"
+            )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report = compare_results(baseline, doc, args.tolerance)
+        print(report.to_string(index=False))
+        if report["regression"].any():
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
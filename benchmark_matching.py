@@ -0,0 +1,457 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+
+# -------------------------------------------------------------------
+# Benchmark harness for the reoccurrence matching engine
+#
+#   python benchmark_matching.py --rows 10000 100000 --out bench.json
+#   python benchmark_matching.py --rows 10000 100000 --compare bench.json
+#
+# Every (rows, stage) run happens in a fresh worker process, and RSS is
+# sampled only while the timed stage runs, so stage_rss_mb is that
+# stage's own memory. Results are written as JSON so runs from
+# different versions can be compared.
+# -------------------------------------------------------------------
+
+first_names = np.array([
+    "James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael",
+    "Linda", "David", "Elizabeth", "William", "Barbara", "Richard", "Susan",
+    "Joseph", "Jessica", "Thomas", "Sarah", "Charles", "Karen", "Daniel",
+    "Nancy", "Matthew", "Lisa", "Anthony", "Betty", "Mark", "Margaret",
+    "Donald", "Sandra", "Steven", "Ashley", "Paul", "Kimberly", "Andrew",
+    "Emily", "Joshua", "Donna", "Kenneth", "Michelle", "Kevin", "Carol",
+    "Brian", "Amanda", "George", "Melissa", "Timothy", "Deborah", "Ronald",
+    "Stephanie", "Jason", "Rebecca", "Edward", "Sharon", "Jeffrey", "Laura",
+    "Ryan", "Cynthia", "Jacob", "Kathleen", "Gary", "Amy", "Nicholas",
+    "Angela", "Eric", "Shirley", "Jonathan", "Anna", "Stephen", "Brenda",
+], dtype=object)
+
+last_names = np.array([
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller",
+    "Davis", "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez",
+    "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+    "Lee", "Perez", "Thompson", "White", "Harris", "Sanchez", "Clark",
+    "Ramirez", "Lewis", "Robinson", "Walker", "Young", "Allen", "King",
+    "Wright", "Scott", "Torres", "Nguyen", "Hill", "Flores", "Green",
+    "Adams", "Nelson", "Baker", "Hall", "Rivera", "Campbell", "Mitchell",
+    "Carter", "Roberts", "Gomez", "Phillips", "Evans", "Turner", "Diaz",
+    "Parker", "Cruz", "Edwards", "Collins", "Reyes", "Stewart", "Morris",
+], dtype=object)
+
+street_names = np.array([
+    "Main", "Oak", "Pine", "Maple", "Cedar", "Elm", "Birch", "Walnut",
+    "Chestnut", "Spruce", "Market", "Liberty", "Penn", "Lincoln", "Washington",
+], dtype=object)
+
+# Same street type written two ways, to exercise address normalization
+street_suffixes = np.array([
+    "St", "Street", "Ave", "Avenue", "Rd", "Road", "Dr", "Drive", "Ln", "Lane",
+], dtype=object)
+
+cities = np.array([
+    "Philadelphia", "Pittsburgh", "Allentown", "Erie", "Reading",
+    "Scranton", "Bethlehem", "Lancaster", "Harrisburg", "York",
+], dtype=object)
+
+other_subcategories = np.array([
+    "Physical Abuse", "Neglect", "Sexual Abuse", "Emotional Abuse",
+], dtype=object)
+
+family_relationships = np.array(main.allowed_relationships, dtype=object)
+
+non_family_relationships = np.array([
+    "Paramour", "Neighbor", "Family Friend", "Other", "Unknown",
+], dtype=object)
+
+family_slot_relationships = np.array([
+    "Mother-Biological", "Father-Biological", "Sibling-Full",
+], dtype=object)
+
+
+# -------------------------------------------------------------------
+# Synthetic longitudinal referral generator
+# -------------------------------------------------------------------
+
+def blank_out(values, rate, rng, blank=None):
+    """Replace a random `rate` share of values with a blank."""
+    values = values.astype(object) if blank is None else values
+    mask = rng.random(len(values)) < rate
+    values[mask] = blank
+    return values
+
+
+def generate_referrals(
+    n_rows,
+    seed=0,
+    group_size_mean=4.0,
+    csa_rate=0.3,
+    blank_rate=0.05,
+    dup_perp_rate=0.5,
+    perp_variation_rate=0.2,
+    allegations_per_referral=1.5,
+):
+    """
+    Seeded synthetic main / relatives / address tables in the schema
+    add_perp_reoccurrence_flag, add_perp_in_family_and_address_flags and
+    summarize_perp_reoccurrence expect.
+
+    n_rows               : rows of the main (allegation x perp) table
+    group_size_mean      : mean rows per (long_person_id, person_id) group
+                           (geometric distribution)
+    csa_rate             : share of index referrals that are
+                           'Child Sexually Acting Out'
+    blank_rate           : share of each identity field left blank
+    dup_perp_rate        : share of rows naming the child's recurring perp
+    perp_variation_rate  : share of recurring-perp rows with one field
+                           changed (FN or DOB), giving likely matches
+    allegations_per_referral : mean rows per referral
+
+    Returns (df, df_rel, df_add).
+    """
+    rng = np.random.default_rng(seed)
+
+    # Groups: (long_person_id, person_id), two children per long_person_id
+    sizes = rng.geometric(1.0 / group_size_mean, size=int(n_rows / group_size_mean * 1.2) + 10)
+    sizes = sizes[: np.searchsorted(np.cumsum(sizes), n_rows) + 1]
+    sizes[-1] -= sizes.sum() - n_rows
+    sizes = sizes[sizes > 0]
+    n_groups = len(sizes)
+
+    group = np.repeat(np.arange(n_groups), sizes)
+    group_start = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    # Referrals: a new referral starts on a group's first row, then at random
+    new_referral = rng.random(n_rows) < 1.0 / allegations_per_referral
+    new_referral[group_start] = True
+    referral = np.cumsum(new_referral) - 1
+    referral_local = referral - referral[group_start][group]
+    n_referrals = referral[-1] + 1 if n_rows else 0
+    referral_group = group[np.flatnonzero(new_referral)]
+
+    is_index = referral_local == 0
+    referral_is_index = is_index[np.flatnonzero(new_referral)]
+
+    subcategory_by_referral = other_subcategories[rng.integers(0, len(other_subcategories), n_referrals)]
+    csa = referral_is_index & (rng.random(n_referrals) < csa_rate)
+    subcategory_by_referral[csa] = "Child Sexually Acting Out"
+
+    # Perpetrators: the group's recurring perp (people id = group) or a
+    # one-off perp (people id = n_groups + row)
+    recurring = rng.random(n_rows) < dup_perp_rate
+    # the index referral of a CSA group always names the recurring perp
+    recurring |= is_index & csa[referral]
+    people = np.where(recurring, group, n_groups + np.arange(n_rows))
+    n_people = n_groups + n_rows
+
+    people_fn = rng.integers(0, len(first_names), n_people)
+    people_ln = rng.integers(0, len(last_names), n_people)
+    people_dob = (
+        np.datetime64("1960-01-01")
+        + rng.integers(0, 365 * 35, n_people).astype("timedelta64[D]")
+    )
+    people_ssn = rng.integers(100000000, 899999999, n_people)
+    people_rel = np.where(
+        rng.random(n_people) < 0.6,
+        family_relationships[rng.integers(0, len(family_relationships), n_people)],
+        non_family_relationships[rng.integers(0, len(non_family_relationships), n_people)],
+    )
+
+    fn_idx = people_fn[people]
+    dob = people_dob[people]
+    vary = recurring & (rng.random(n_rows) < perp_variation_rate)
+    vary_fn = vary & (rng.random(n_rows) < 0.5)
+    vary_dob = vary & ~vary_fn
+    fn_idx[vary_fn] = (fn_idx[vary_fn] + 1) % len(first_names)
+    dob[vary_dob] = dob[vary_dob] + np.timedelta64(1, "D")
+
+    df = pd.DataFrame({
+        "long_person_id": group // 2,
+        "person_id": group,
+        "referral_id": referral,
+        "allegation_id": np.arange(n_rows),
+        "is_index": np.where(is_index, "Y", "N"),
+        "referral_sequence_type": np.where(is_index, "Index", "Subsequent"),
+        "subcategory_of_abuse": subcategory_by_referral[referral],
+        "perp_first_name": blank_out(first_names[fn_idx], blank_rate, rng),
+        "perp_last_name": blank_out(last_names[people_ln[people]], blank_rate, rng),
+        "perp_date_of_birth": blank_out(pd.to_datetime(dob).to_numpy(), blank_rate, rng, np.datetime64("NaT")),
+        "perp_date_of_birth_estimated": np.where(rng.random(n_rows) < 0.05, "Y", "N"),
+        "perp_social_security_number": blank_out(people_ssn[people].astype(float), blank_rate, rng, np.nan),
+        "perp_relationship": people_rel[people],
+    })
+
+    # Relatives: each group has a family of three; every referral lists
+    # each family member with 80% probability
+    slots = np.tile(np.arange(3), n_referrals)
+    rel_referral = np.repeat(np.arange(n_referrals), 3)
+    keep = rng.random(len(slots)) < 0.8
+    slots, rel_referral = slots[keep], rel_referral[keep]
+    member = referral_group[rel_referral] * 3 + slots
+    n_members = n_groups * 3
+
+    member_fn = rng.integers(0, len(first_names), n_members)
+    member_dob = (
+        np.datetime64("1980-01-01")
+        + rng.integers(0, 365 * 40, n_members).astype("timedelta64[D]")
+    )
+    member_ssn = rng.integers(100000000, 899999999, n_members).astype(float)
+    family_ln = rng.integers(0, len(last_names), n_groups)
+
+    n_rel = len(member)
+    df_rel = pd.DataFrame({
+        "referral_id": rel_referral,
+        "relative_relationship": family_slot_relationships[slots],
+        "relative_first_name": blank_out(first_names[member_fn[member]], blank_rate, rng),
+        "relative_last_name": blank_out(last_names[family_ln[member // 3]], blank_rate, rng),
+        "relative_date_of_birth": blank_out(pd.to_datetime(member_dob[member]).to_numpy(), blank_rate, rng, np.datetime64("NaT")),
+        "relative_social_security_number": blank_out(member_ssn[member], blank_rate, rng, np.nan),
+        "relative_date_of_birth_estimated": np.where(rng.random(n_rel) < 0.05, "Y", "N"),
+    })
+
+    # Addresses: one Primary per referral (the family's address 70% of the
+    # time, written with either suffix spelling) plus some Mailing rows
+    family_number = rng.integers(1, 9999, n_groups)
+    family_street = rng.integers(0, len(street_names), n_groups)
+    family_suffix = rng.integers(0, len(street_suffixes) // 2, n_groups) * 2
+    family_city = rng.integers(0, len(cities), n_groups)
+
+    own = rng.random(n_referrals) < 0.7
+    g = referral_group
+    number = np.where(own, family_number[g], rng.integers(1, 9999, n_referrals))
+    street = np.where(own, family_street[g], rng.integers(0, len(street_names), n_referrals))
+    suffix = np.where(own, family_suffix[g], rng.integers(0, len(street_suffixes) // 2, n_referrals) * 2)
+    suffix = suffix + (rng.random(n_referrals) < 0.5)   # 'St' vs 'Street'
+    city = np.where(own, family_city[g], rng.integers(0, len(cities), n_referrals))
+
+    line1 = (
+        pd.Series(number).astype(str)
+        + " " + pd.Series(street_names[street])
+        + " " + pd.Series(street_suffixes[suffix])
+    )
+    primary = pd.DataFrame({
+        "Referral ID": np.arange(n_referrals),
+        "Address Type": "Primary",
+        "Address Line 1": blank_out(line1.to_numpy(), blank_rate, rng),
+        "City": cities[city],
+        "Zip Code": 15000 + city * 100,
+    })
+    mailing = primary[rng.random(n_referrals) < 0.3].assign(**{"Address Type": "Mailing"})
+    df_add = pd.concat([primary, mailing], ignore_index=True)
+
+    return df, df_rel, df_add
+
+
+# -------------------------------------------------------------------
+# Measurement (runs inside a worker process)
+# -------------------------------------------------------------------
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        return peak_rss_mb()
+
+
+class RssSampler:
+    """Highest RSS seen while the with-block runs, sampled every interval seconds."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self.done = threading.Event()
+
+    def sample(self):
+        while not self.done.is_set():
+            self.peak_mb = max(self.peak_mb, current_rss_mb())
+            self.done.wait(self.interval)
+
+    def __enter__(self):
+        self.peak_mb = current_rss_mb()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.done.set()
+        self.thread.join()
+        self.peak_mb = max(self.peak_mb, current_rss_mb())
+
+
+def run_stage(stage, n_rows, params, n_jobs=1):
+    """
+    Generate data, run the stages before `stage`, then time `stage`.
+    Memory is sampled only while `stage` runs: stage_rss_mb is its peak RSS
+    minus the RSS before it started (data generation and earlier stages
+    excluded).
+    """
+    df, df_rel, df_add = generate_referrals(n_rows, **params)
+    pairs = len(main.index_csa_subsequent_pairs(df))
+
+    if stage in ("summarize", "annotate"):
+        df_flag = main.add_perp_reoccurrence_flag(df, df_rel, df_add, n_jobs=n_jobs)
+
+    if stage not in ("flag", "summarize", "annotate"):
+        raise ValueError(f"unknown stage: {stage}")
+
+    rss_before = current_rss_mb()
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        if stage == "flag":
+            main.add_perp_reoccurrence_flag(df, df_rel, df_add, n_jobs=n_jobs)
+        elif stage == "summarize":
+            main.summarize_perp_reoccurrence(df_flag)
+        else:
+            main.add_perp_in_family_and_address_flags(df_flag, df_add)
+        wall = time.perf_counter() - start
+
+    return {
+        "stage": stage,
+        "rows": n_rows,
+        "relatives_rows": len(df_rel),
+        "address_rows": len(df_add),
+        "candidate_pairs": pairs,
+        "wall_s": round(wall, 4),
+        "pairs_per_s": round(pairs / wall, 1) if stage == "flag" and wall > 0 else None,
+        "rows_per_s": round(n_rows / wall, 1) if wall > 0 else None,
+        "rss_before_mb": round(rss_before, 1),
+        "peak_rss_mb": round(rss.peak_mb, 1),
+        "stage_rss_mb": round(rss.peak_mb - rss_before, 1),
+    }
+
+
+def run_in_worker(stage, n_rows, params, n_jobs):
+    """Run one measurement in a fresh interpreter and return its result dict."""
+    spec = json.dumps({"stage": stage, "rows": n_rows, "params": params, "n_jobs": n_jobs})
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--worker", spec],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+# -------------------------------------------------------------------
+# Baselines
+# -------------------------------------------------------------------
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare_results(baseline, current, tolerance=0.2):
+    """
+    Compare two result documents on (stage, rows). A run is a regression
+    when wall time or the stage's own memory (stage_rss_mb) grew by more
+    than `tolerance` (0.2 = 20%); stage memory below 1 MB counts as 1 MB so
+    noise in tiny stages is not flagged. Returns a DataFrame with one row
+    per matching run.
+    """
+    key = ["stage", "rows"]
+    base = pd.DataFrame(baseline["results"]).set_index(key)
+    cur = pd.DataFrame(current["results"]).set_index(key)
+    if "stage_rss_mb" not in base:
+        raise ValueError("baseline has no stage_rss_mb (written by an older harness); re-run it")
+    both = base[["wall_s", "stage_rss_mb"]].join(
+        cur[["wall_s", "stage_rss_mb"]], lsuffix="_base", rsuffix="_new", how="inner"
+    )
+    both["wall_ratio"] = both["wall_s_new"] / both["wall_s_base"]
+    both["rss_ratio"] = both["stage_rss_mb_new"].clip(lower=1.0) / both["stage_rss_mb_base"].clip(lower=1.0)
+    both["regression"] = (both["wall_ratio"] > 1 + tolerance) | (both["rss_ratio"] > 1 + tolerance)
+    return both.reset_index()
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the perp reoccurrence matching engine.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--stages", nargs="+", default=["flag", "summarize", "annotate"])
+    parser.add_argument("--n-jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--group-size-mean", type=float, default=4.0)
+    parser.add_argument("--csa-rate", type=float, default=0.3)
+    parser.add_argument("--blank-rate", type=float, default=0.05)
+    parser.add_argument("--dup-perp-rate", type=float, default=0.5)
+    parser.add_argument("--label", default=None, help="name stored with the results (default: git revision)")
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        spec = json.loads(args.worker)
+        result = run_stage(spec["stage"], spec["rows"], spec["params"], spec["n_jobs"])
+        print(json.dumps(result))
+        return 0
+
+    params = {
+        "seed": args.seed,
+        "group_size_mean": args.group_size_mean,
+        "csa_rate": args.csa_rate,
+        "blank_rate": args.blank_rate,
+        "dup_perp_rate": args.dup_perp_rate,
+    }
+    doc = {
+        "label": args.label or git_revision(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "n_jobs": args.n_jobs,
+        "params": params,
+        "results": [],
+    }
+
+    for n_rows in args.rows:
+        for stage in args.stages:
+            result = run_in_worker(stage, n_rows, params, args.n_jobs)
+            doc["results"].append(result)
+            print(
+                f"{stage:<10} rows={n_rows:>10,}  wall={result['wall_s']:>9.3f}s  "
+                f"stage_rss=+{result['stage_rss_mb']:.1f}MB  pairs={result['candidate_pairs']:,}"
+            )
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(doc, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report = compare_results(baseline, doc, args.tolerance)
+        print(report.to_string(index=False))
+        if report["regression"].any():
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -1,11 +1,20 @@
 import streamlit as st
 import os
+import io
+import hashlib
+import zipfile
 import pandas as pd
-import seaborn as sns
+import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import openai
 import base64
+import xlsxwriter
+from profile_sketches import profile_csv
+from profile_correlation import correlation_matrix, top_correlations, cluster_order, correlation_heatmap
+from profile_prompt import PromptAnalyzer, OpenAIBackend, StubBackend, dataset_context
 import warnings
 warnings.filterwarnings("ignore")
 
@@ -13,133 +22,648 @@ warnings.filterwarnings("ignore")
 load_dotenv()
 openai.api_key = ''
 
+# Profiling results are cached per upload content hash; only this many
+# uploads are kept, least recently used evicted first.
+MAX_CACHED_UPLOADS = 4
+
+# Column types are inferred from this many leading rows
+INFER_SAMPLE_ROWS = 10_000
+# Text columns with at most this share of distinct values load as categoricals
+CATEGORY_MAX_RATIO = 0.5
+# Uploads bigger than this in memory are downsampled for preview, charts and prompts
+MAX_FRAME_MB = 512
+# Prompt analysis: DATAPROFILE_LLM=stub answers with a local stub model
+LLM_BACKEND = os.getenv("DATAPROFILE_LLM", "openai")
+PROMPT_TOKEN_BUDGET = 1500
+
+
+# -------------------------------------------------------------------
+# Profiling (pure functions of the uploaded data)
+# -------------------------------------------------------------------
+
+def upload_fingerprint(uploaded_file):
+    """sha256 of the upload, hashed once per upload and session."""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    key = (uploaded_file.file_id, uploaded_file.size)
+    if key not in hashes:
+        hashes[key] = hashlib.sha256(uploaded_file.getvalue()).hexdigest()
+    return hashes[key]
+
+
+def upload_stream(uploaded_file):
+    """The upload rewound to its start, so it can be read again without a copy."""
+    uploaded_file.seek(0)
+    return uploaded_file
+
+
+def looks_like_dates(values):
+    """Text values (not plain numbers) that almost all parse as dates."""
+    text = values.dropna().astype(str)
+    if text.empty or not text.str.contains(r"\d").all():
+        return False
+    if text.str.fullmatch(r"[-+]?\d+(\.\d+)?").all():
+        return False
+    return pd.to_datetime(text, errors="coerce", format="mixed").notna().mean() >= 0.95
+
+
+def sample_date_format(values):
+    """
+    The format guessed from the first date, if it parses every date in the
+    sample that format="mixed" parses; None when the sample mixes formats.
+    """
+    text = values.dropna().astype(str)
+    fmt = pd.tseries.api.guess_datetime_format(text.iloc[0])
+    if fmt is None:
+        return None
+    fits = pd.to_datetime(text, format=fmt, errors="coerce").notna().sum()
+    mixed = pd.to_datetime(text, format="mixed", errors="coerce").notna().sum()
+    return fmt if fits >= mixed else None
+
+
+@st.cache_data(max_entries=MAX_CACHED_UPLOADS)
+def infer_upload_types(file_hash, _uploaded_file):
+    """
+    Column types from the first INFER_SAMPLE_ROWS rows: "numeric", "datetime",
+    "category" or "text", plus the date format of each datetime column
+    (None when the sample mixes formats).
+    """
+    sample = pd.read_csv(upload_stream(_uploaded_file), nrows=INFER_SAMPLE_ROWS)
+    types, date_formats = {}, {}
+    for col in sample.columns:
+        values = sample[col]
+        if pd.api.types.is_numeric_dtype(values):
+            types[col] = "numeric"
+        elif looks_like_dates(values):
+            types[col] = "datetime"
+            date_formats[col] = sample_date_format(values)
+        elif values.nunique() <= CATEGORY_MAX_RATIO * max(len(values), 1):
+            types[col] = "category"
+        else:
+            types[col] = "text"
+    return types, date_formats
+
+
+def date_read_kwargs(date_formats, columns):
+    """read_csv arguments that parse the inferred date columns (mixed formats per value)."""
+    date_cols = [col for col in date_formats if col in columns]
+    formats = {col: date_formats[col] or "mixed" for col in date_cols}
+    return {"parse_dates": date_cols, "date_format": formats or None}
+
+
+def estimate_frame_mb(uploaded_file, columns):
+    """
+    Memory the selected columns need once loaded, estimated from the first
+    INFER_SAMPLE_ROWS rows and the upload size. Returns (MB, rows).
+    """
+    head = pd.read_csv(
+        upload_stream(uploaded_file), nrows=INFER_SAMPLE_ROWS,
+        usecols=list(columns), dtype_backend="pyarrow",
+    )
+    head_mb = head.memory_usage(deep=True).sum() / 2**20
+    stream = upload_stream(uploaded_file)
+    head_bytes = sum(len(stream.readline()) for _ in range(len(head) + 1))
+    if len(head) < INFER_SAMPLE_ROWS or not head_bytes:
+        return head_mb, len(head)
+    scale = stream.seek(0, io.SEEK_END) / head_bytes
+    return head_mb * scale, int(len(head) * scale)
+
+
+def sample_rows(source, n, columns, chunksize=100_000, seed=0):
+    """
+    Uniform random sample of n rows, read chunk by chunk: every row gets a
+    random key and the n smallest keys are kept, so only about n rows plus
+    one chunk are ever in memory. Returns (sample in file order, total rows).
+    """
+    rng = np.random.default_rng(seed)
+    kept, keys, total = None, None, 0
+    for chunk in pd.read_csv(source, usecols=list(columns), chunksize=chunksize):
+        total += len(chunk)
+        chunk_keys = rng.random(len(chunk))
+        if kept is None:
+            kept, keys = chunk, chunk_keys
+        else:
+            kept, keys = pd.concat([kept, chunk]), np.concatenate([keys, chunk_keys])
+        if len(kept) > n:
+            smallest = np.argpartition(keys, n)[:n]
+            kept, keys = kept.iloc[smallest], keys[smallest]
+    sample = kept.sort_index().convert_dtypes(dtype_backend="pyarrow")
+    # columns that changed type between chunks: text, as the pyarrow engine reads them
+    mixed = sample.columns[sample.dtypes == object]
+    sample[mixed] = sample[mixed].astype("string[pyarrow]")
+    return sample, total
+
+
+def cap_warning(size_mb, max_mb, n_sampled, n_rows):
+    return (
+        f"The upload needs about {size_mb:,.0f} MB in memory, over the {max_mb:,} MB cap: "
+        f"preview, charts and prompts use a random {n_sampled / n_rows:.0%} sample "
+        f"({n_sampled:,} of {n_rows:,} rows). Statistics, Summary and "
+        f"Null Values still cover every row."
+    )
+
+
+def cap_frame(df, max_mb=MAX_FRAME_MB):
+    """Downsample df to about max_mb of memory; returns (df, warning or None)."""
+    size_mb = df.memory_usage(deep=True).sum() / 2**20
+    if size_mb <= max_mb:
+        return df, None
+    sampled = df.sample(frac=max_mb / size_mb, random_state=0).sort_index()
+    return sampled, cap_warning(size_mb, max_mb, len(sampled), len(df))
+
+
+def apply_upload_types(df, types, date_formats):
+    """
+    Inferred datetime / category types, in place. Columns the reader
+    already parsed as dates are only converted; text columns are parsed
+    with the inferred format. Returns a warning naming the parsed columns
+    where values that are not dates (in that format) became blank, or None.
+    """
+    lost = {}
+    for col in df.columns:
+        if types[col] == "datetime" and pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            # already parsed by the reader (pyarrow timestamp / date): its
+            # text form ('2020-01-01T00:00:00') would not fit the sample format
+            df[col] = pd.to_datetime(df[col])
+        elif types[col] == "datetime":
+            fmt = date_formats[col] or "mixed"
+            parsed = pd.to_datetime(df[col].astype(str), format=fmt, errors="coerce")
+            n_lost = int((df[col].notna() & parsed.isna()).sum())
+            if n_lost:
+                lost[col] = n_lost
+            df[col] = parsed
+        elif types[col] == "category":
+            df[col] = df[col].astype("category")
+    if not lost:
+        return None
+    return "Values that did not parse as dates are shown as blank: " + ", ".join(
+        f"{col} ({n:,} of {df[col].size:,})" for col, n in lost.items()
+    ) + "."
+
+
+# cache_resource hands back the same frame instead of a pickled copy
+@st.cache_resource(max_entries=MAX_CACHED_UPLOADS, show_spinner="Reading upload...")
+def load_upload(file_hash, columns, _uploaded_file, _types, _date_formats):
+    """
+    Read the selected columns with the pyarrow engine into Arrow-backed
+    dtypes, then apply the inferred datetime / category types. Uploads
+    estimated over MAX_FRAME_MB are never loaded whole: a random sample
+    that fits the cap is drawn while reading (sample_rows).
+    Returns (df, warning or None).
+    """
+    size_mb, n_rows = estimate_frame_mb(_uploaded_file, columns)
+    if size_mb > MAX_FRAME_MB:
+        n = max(1, int(n_rows * MAX_FRAME_MB / size_mb))
+        df, n_rows = sample_rows(upload_stream(_uploaded_file), n, columns)
+        notes = [cap_warning(size_mb, MAX_FRAME_MB, len(df), n_rows)]
+    else:
+        df = pd.read_csv(
+            upload_stream(_uploaded_file),
+            engine="pyarrow", dtype_backend="pyarrow", usecols=list(columns),
+        )
+        notes = []
+    notes.append(apply_upload_types(df, _types, _date_formats))
+    # the estimate is a guess: still cap a frame that came out bigger
+    df, cap = cap_frame(df)
+    notes.append(cap)
+    return df, "\n\n".join(note for note in notes if note) or None
+
+
+# HyperLogLog distinct counts are within ~1%, so in approximate mode a
+# column counts as an ID when its distinct count is this close to the rows
+APPROX_ID_TOLERANCE = 0.03
+
+
+def profile_upload(source, mode="exact", **read_kwargs):
+    """
+    Column classification and the Statistics / Summary / Null Values tables
+    from one chunked pass over the CSV (profile_sketches.profile_csv).
+    mode="approx" keeps memory constant per column for very large files.
+    """
+    profile = profile_csv(source, mode=mode, **read_kwargs)
+    nunique = profile.nunique()
+    kinds = profile.kinds()
+
+    # Column classification
+    dtypes = {col: str(sketch.dtype) for col, sketch in profile.columns.items()}
+    num_columns = [col for col in kinds["numeric"] if dtypes[col] in ("float64", "int64")]
+    cat_columns = [col for col in kinds["text"] if dtypes[col] == "object"]
+    date_columns = kinds["datetime"]
+
+    # Exclude likely ID cols
+    id_threshold = profile.n_rows * (1 - APPROX_ID_TOLERANCE if mode == "approx" else 1)
+    likely_id_cols = [col for col in nunique.index if nunique[col] >= id_threshold]
+    num_columns = [col for col in num_columns if col not in likely_id_cols]
+
+    return {
+        "n_rows": profile.n_rows,
+        "num_columns": num_columns,
+        "cat_columns": cat_columns,
+        "date_columns": date_columns,
+        "nunique": nunique,
+        "top_values": profile.top_values(5),
+        "statistics": profile.statistics(),
+        "summary": profile.summary(),
+        "missing": profile.missing(),
+    }
+
+
+@st.cache_data(max_entries=MAX_CACHED_UPLOADS, show_spinner="Profiling...")
+def cached_profile(file_hash, mode, columns, _uploaded_file, _date_formats):
+    return profile_upload(
+        upload_stream(_uploaded_file), mode,
+        usecols=list(columns), **date_read_kwargs(_date_formats, columns),
+    )
+
+
+# -------------------------------------------------------------------
+# Prompt analysis (profile_prompt: compact context, cached, streamed)
+# -------------------------------------------------------------------
+
+@st.cache_resource
+def prompt_analyzer():
+    """One analyzer (and response cache) shared by all sessions."""
+    backend = StubBackend() if LLM_BACKEND == "stub" else OpenAIBackend("gpt-4", temperature=0.3, max_tokens=1200)
+    return PromptAnalyzer(backend)
+
+
+# -------------------------------------------------------------------
+# Profile export
+#
+# Built in memory only when the download button is clicked (Streamlit runs
+# the data callable then) and kept per upload, mode and column selection,
+# so nothing is written to the server's working directory and concurrent
+# sessions never share a file.
+# -------------------------------------------------------------------
+
+EXPORT_FORMATS = {
+    "Excel": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet (zip)": (".zip", "application/zip"),
+    "CSV (zip)": (".zip", "application/zip"),
+}
+
+
+def profile_tables(profile, correlation):
+    """Exported tables by sheet name, index labels moved into a first column."""
+    tables = {
+        "Statistics": profile["statistics"].rename_axis("Statistic").reset_index(),
+        "Summary": profile["summary"],
+        "Null Values": profile["missing"],
+    }
+    if correlation is not None:
+        tables["Correlations"] = correlation["top_pairs"]
+        tables["Correlation Matrix"] = correlation["matrix"].rename_axis("Column").reset_index()
+    return tables
+
+
+def excel_value(value):
+    """A cell value xlsxwriter can write: blanks for missing, text for the rest."""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, float):
+        return value if np.isfinite(value) else (None if np.isnan(value) else str(value))
+    if isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+
+def excel_bytes(tables):
+    """xlsx workbook, one sheet per table, written row by row in constant_memory mode."""
+    buffer = io.BytesIO()
+    workbook = xlsxwriter.Workbook(buffer, {"constant_memory": True})
+    header = workbook.add_format({"bold": True})
+    for name, table in tables.items():
+        sheet = workbook.add_worksheet(name[:31])
+        sheet.write_row(0, 0, [str(col) for col in table.columns], header)
+        for row, values in enumerate(table.itertuples(index=False), start=1):
+            sheet.write_row(row, 0, [excel_value(value) for value in values])
+    workbook.close()
+    return buffer.getvalue()
+
+
+def bundle_bytes(tables, fmt):
+    """zip of one .parquet or .csv file per table."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as bundle:
+        for name, table in tables.items():
+            stem = name.lower().replace(" ", "_")
+            if fmt == "csv":
+                bundle.writestr(f"{stem}.csv", table.to_csv(index=False))
+            else:
+                # Summary mixes types in Sample Value / Data Type: store object columns as text
+                table = table.copy()
+                for col in table.columns[table.dtypes == object]:
+                    table[col] = table[col].map(lambda v: None if v is None or v is pd.NA else str(v))
+                part = io.BytesIO()
+                table.to_parquet(part, index=False)
+                bundle.writestr(f"{stem}.parquet", part.getvalue(), compress_type=zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+@st.cache_resource(max_entries=MAX_CACHED_UPLOADS)
+def export_cache(file_hash, mode, columns):
+    """Export bytes per format, for one upload, mode and column selection."""
+    return {}
+
+
+def profile_export(cache, export_format, profile, correlation):
+    if export_format not in cache:
+        tables = profile_tables(profile, correlation)
+        if export_format == "Excel":
+            cache[export_format] = excel_bytes(tables)
+        else:
+            cache[export_format] = bundle_bytes(tables, "parquet" if export_format.startswith("Parquet") else "csv")
+    return cache[export_format]
+
+
+def figure_png(fig):
+    """Render a figure to PNG bytes once and release it."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    plt.close(fig)
+    return buf.getvalue()
+
+
+# -------------------------------------------------------------------
+# EDA charts
+#
+# Chart data is precomputed with numpy (histogram bins, a binned KDE,
+# per-period means, a scatter sample) instead of handing every row to
+# seaborn. Figures use the object-oriented matplotlib API, so a section's
+# charts can be drawn in a thread pool; each chart's PNG is cached per
+# upload and column selection, and a section is only drawn once expanded.
+# -------------------------------------------------------------------
+
+EDA_BINS = 40            # histogram bars
+KDE_GRID = 256           # KDE evaluation points
+TIME_BINS = 200          # periods in the date x numeric line plots
+SCATTER_SAMPLE = 5_000   # points in the scatter plot
+MAX_COUNT_CATEGORIES = 20
+EDA_PAGE_SIZE = 12       # charts drawn per page of a section
+EDA_THREADS = min(8, os.cpu_count() or 1)
+
+
+def numeric_values(series):
+    """Finite float64 values of a (possibly Arrow-backed) numeric column."""
+    x = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return x[np.isfinite(x)]
+
+
+def kde_curve(x, grid_size=KDE_GRID):
+    """Gaussian KDE with Scott's bandwidth, convolved over a fine histogram."""
+    n = len(x)
+    lo, hi = x.min(), x.max()
+    bandwidth = x.std() * n ** -0.2
+    if n < 2 or hi == lo or not bandwidth:
+        return None
+    counts, edges = np.histogram(x, bins=grid_size, range=(lo, hi))
+    step = edges[1] - edges[0]
+    half = int(min(grid_size // 2 - 1, np.ceil(4 * bandwidth / step)))
+    kernel = np.exp(-0.5 * (np.arange(-half, half + 1) * step / bandwidth) ** 2)
+    density = np.convolve(counts, kernel, mode="same") / (n * bandwidth * np.sqrt(2 * np.pi))
+    return (edges[:-1] + edges[1:]) / 2, density
+
+
+def histogram_chart(series):
+    x = numeric_values(series)
+    fig = Figure()
+    ax = fig.subplots()
+    if len(x):
+        counts, edges = np.histogram(x, bins=EDA_BINS)
+        ax.stairs(counts, edges, fill=True, color="C0", alpha=0.6)
+        curve = kde_curve(x)
+        if curve is not None:
+            # density scaled to the bar heights
+            ax.plot(curve[0], curve[1] * len(x) * (edges[1] - edges[0]), color="C0")
+    ax.set_xlabel(series.name)
+    ax.set_ylabel("Count")
+    return fig
+
+
+def count_chart(series):
+    counts = series.value_counts().head(MAX_COUNT_CATEGORIES)
+    fig = Figure()
+    ax = fig.subplots()
+    ax.barh(counts.index.astype(str)[::-1], counts.values[::-1], color="C0")
+    ax.set_xlabel("count")
+    ax.set_ylabel(series.name)
+    return fig
+
+
+def scatter_chart(x, y, hue):
+    sample = pd.DataFrame({"x": x, "y": y, "hue": hue}).dropna(subset=["x", "y"])
+    if len(sample) > SCATTER_SAMPLE:
+        sample = sample.sample(SCATTER_SAMPLE, random_state=0)
+    fig = Figure()
+    ax = fig.subplots()
+    # ten most frequent categories get their own colour
+    for i, level in enumerate(sample["hue"].value_counts().index[:10]):
+        part = sample[sample["hue"] == level]
+        ax.scatter(numeric_values(part["x"]), numeric_values(part["y"]), s=8, color=f"C{i}", label=str(level))
+    ax.set_xlabel(x.name)
+    ax.set_ylabel(y.name)
+    ax.legend(title=hue.name, fontsize="small")
+    return fig
+
+
+def time_chart(dates, values):
+    """Mean of values per period, TIME_BINS equal periods over the date range."""
+    t = dates.to_numpy(dtype="datetime64[ns]")
+    v = values.to_numpy(dtype=np.float64, na_value=np.nan)
+    ok = ~np.isnat(t) & np.isfinite(v)
+    t, v = t[ok].astype(np.int64), v[ok]
+    fig = Figure()
+    ax = fig.subplots()
+    if len(t):
+        counts, edges = np.histogram(t, bins=TIME_BINS)
+        sums, _ = np.histogram(t, bins=edges, weights=v)
+        keep = counts > 0
+        centers = ((edges[:-1] + edges[1:]) / 2).astype("datetime64[ns]")
+        ax.plot(centers[keep], sums[keep] / counts[keep], color="C0")
+    fig.autofmt_xdate()
+    ax.set_xlabel(dates.name)
+    ax.set_ylabel(values.name)
+    return fig
+
+
+def eda_sections(profile):
+    """Chart specs per EDA section: (title, [(kind, column, ...), ...])."""
+    num_columns = profile["num_columns"]
+    cat_columns = profile["cat_columns"]
+    date_columns = profile["date_columns"]
+    sections = [
+        ("Distributions", [("hist", col) for col in num_columns]),
+        ("Category counts", [("count", col) for col in cat_columns
+                             if profile["nunique"][col] <= MAX_COUNT_CATEGORIES]),
+        ("Trends over time", [("time", date_col, num_col)
+                              for date_col in date_columns for num_col in num_columns]),
+    ]
+    if len(num_columns) >= 2 and len(cat_columns) >= 1:
+        sections.append(("Relationships", [("scatter", num_columns[0], num_columns[1], cat_columns[0])]))
+    return [(title, charts) for title, charts in sections if charts]
+
+
+def render_chart(spec, df):
+    kind, cols = spec[0], spec[1:]
+    if kind == "hist":
+        fig = histogram_chart(df[cols[0]])
+    elif kind == "count":
+        fig = count_chart(df[cols[0]])
+    elif kind == "time":
+        fig = time_chart(df[cols[0]], df[cols[1]])
+    else:
+        fig = scatter_chart(df[cols[0]], df[cols[1]], df[cols[2]])
+    return figure_png(fig)
+
+
+# -------------------------------------------------------------------
+# Correlation (profile_correlation: blocked float32 products, row sample)
+# -------------------------------------------------------------------
+
+CORR_SAMPLE_ROWS = 200_000
+CORR_TOP_PAIRS = 20
+
+
+@st.cache_data(max_entries=MAX_CACHED_UPLOADS, show_spinner="Computing correlations...")
+def correlation_profile(file_hash, columns, num_columns, _df):
+    """Clustered correlation matrix and strongest pairs, or None below two numeric columns."""
+    if len(num_columns) < 2:
+        return None
+    corr = correlation_matrix(_df, num_columns, sample_rows=CORR_SAMPLE_ROWS)
+    order = cluster_order(corr)
+    return {
+        "matrix": corr.loc[order, order],
+        "top_pairs": top_correlations(corr, CORR_TOP_PAIRS),
+    }
+
+
+@st.cache_data(max_entries=4 * MAX_CACHED_UPLOADS)
+def correlation_png(file_hash, columns, threshold, _correlation):
+    fig = correlation_heatmap(_correlation["matrix"], threshold)
+    return None if fig is None else figure_png(fig)
+
+
+@st.cache_resource(max_entries=MAX_CACHED_UPLOADS)
+def chart_cache(file_hash, columns):
+    """PNG bytes per chart spec, for one upload and column selection."""
+    return {}
+
+
+def chart_pngs(file_hash, columns, specs, df):
+    """PNGs for specs, drawing the ones not cached yet in a thread pool."""
+    cache = chart_cache(file_hash, columns)
+    missing = [spec for spec in specs if spec not in cache]
+    if missing:
+        with ThreadPoolExecutor(EDA_THREADS) as pool:
+            for spec, png in zip(missing, pool.map(lambda spec: render_chart(spec, df), missing)):
+                cache[spec] = png
+    return [cache[spec] for spec in specs]
+
+
+@st.cache_data(max_entries=MAX_CACHED_UPLOADS)
+def missing_figure(file_hash, mode, columns, _profile):
+    missing_df = _profile["missing"]
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.bar(missing_df['Column'], missing_df['Not Missing Values'], label='Not Missing', color='blue')
+    ax.bar(missing_df['Column'], missing_df['Missing Values'], bottom=missing_df['Not Missing Values'], label='Missing', color='red')
+    ax.set_xticklabels(missing_df['Column'], rotation=45, ha='right')
+    ax.set_ylabel("Count")
+    ax.set_title("Proportion of Missing Values in Each Column")
+    ax.legend()
+    return figure_png(fig)
+
+
 # Streamlit UI
 st.title("Prompt-driven Data Profiling")
 uploaded_file = st.file_uploader("Upload a CSV file for analysis", type=['csv'])
 
 if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
+    file_hash = upload_fingerprint(uploaded_file)
+    mode = st.radio(
+        "Profiling mode", ["Exact", "Approximate"], horizontal=True,
+        help="Approximate uses sketches (HyperLogLog, t-digest) for very large files.",
+    )
+    types, date_formats = infer_upload_types(file_hash, uploaded_file)
+    all_columns = list(types)
+    columns = tuple(st.multiselect("Columns to profile", all_columns, default=all_columns) or all_columns)
+
+    profile = cached_profile(file_hash, "exact" if mode == "Exact" else "approx", columns, uploaded_file, date_formats)
+    df, sample_warning = load_upload(file_hash, columns, uploaded_file, types, date_formats)
+    if sample_warning:
+        st.warning(sample_warning)
+    correlation = correlation_profile(file_hash, columns, tuple(profile["num_columns"]), df)
+
     st.write("**Preview of Uploaded Data**")
     st.dataframe(df.head(3))
 
-    filename = "data_profile_" + uploaded_file.name.split('.')[0] + ".xlsx"
-
-    # Column classification
-    num_columns = df.select_dtypes(include=['float64', 'int64']).columns.tolist()
-    cat_columns = df.select_dtypes(include=['object']).columns.tolist()
-    date_columns = df.select_dtypes(include=['datetime', 'datetime64']).columns.tolist()
+    export_format = st.radio("Export format", list(EXPORT_FORMATS), horizontal=True)
+    suffix, mime = EXPORT_FORMATS[export_format]
+    exports = export_cache(file_hash, mode, columns)
 
-    # Exclude likely ID cols
-    likely_id_cols = [col for col in df.columns if df[col].nunique() == df.shape[0]]
-    for col in likely_id_cols:
-        if col in num_columns:
-            num_columns.remove(col)
-
-    # Write Excel with Pandas summary
-    with pd.ExcelWriter(filename) as writer:
-        df.describe().to_excel(writer, sheet_name="Statistics")
-
-        summary_df = pd.DataFrame({
-            'Feature': df.columns,
-            'Data Type': [df[col].dtype for col in df.columns],
-            'Number of Unique Values': [df[col].nunique() for col in df.columns],
-            'Sample Value': [df[col].iloc[0] for col in df.columns],
-            'Contains Nulls': [df[col].isnull().any() for col in df.columns]
-        })
-        summary_df.to_excel(writer, sheet_name="Summary")
-
-        missing_counts = df.isnull().sum()
-        not_missing_counts = df.shape[0] - missing_counts
-        missing_percentage = (missing_counts / df.shape[0]) * 100
-        missing_df = pd.DataFrame({
-            'Column': df.columns,
-            'Missing Values': missing_counts.values,
-            'Not Missing Values': not_missing_counts.values,
-            'Percentage Missing': missing_percentage.values
-        })
-        missing_df.to_excel(writer, sheet_name="Null Values")
-
-    with open(filename, "rb") as f:
-        st.download_button(
-            label="Download Data Profile as Excel",
-            data=f.read(),
-            file_name=filename,
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-        )
+    st.download_button(
+        label=f"Download Data Profile ({export_format})",
+        data=lambda: profile_export(exports, export_format, profile, correlation),
+        file_name="data_profile_" + uploaded_file.name.split('.')[0] + suffix,
+        mime=mime
+    )
 
-    # Tabs
-    tab_prompt, tab_eda, tab_stats, tab_summary, tab_null = st.tabs(["Prompt Analysis", "EDA", "Statistics", "Summary", "Null Values"])
+    # Tabs (EDA and Null Values are only drawn while open)
+    tab_prompt, tab_eda, tab_stats, tab_summary, tab_null = st.tabs(
+        ["Prompt Analysis", "EDA", "Statistics", "Summary", "Null Values"],
+        key="profile_tabs", on_change="rerun",
+    )
 
     # Prompt Analysis with GPT
     with tab_prompt:
         prompt = st.text_area("Enter your prompt")
         if st.button("Generate"):
             if prompt:
-                with st.spinner("Generating response..."):
-                    sample_data = df.head(5).to_string()
-                    messages = [
-                        {"role": "system", "content": "You are a data profiling assistant."},
-                        {"role": "user", "content": f"Here is a sample of the dataset:\n{sample_data}\n\n{prompt}"}
-                    ]
-                    response = openai.ChatCompletion.create(
-                        model="gpt-4",
-                        messages=messages,
-                        temperature=0.3,
-                        max_tokens=1200
-                    )
-                    result = response['choices'][0]['message']['content']
-                    st.markdown("### Response")
-                    st.markdown(result)
+                context = dataset_context(profile, correlation, PROMPT_TOKEN_BUDGET)
+                st.markdown("### Response")
+                st.write_stream(prompt_analyzer().stream((file_hash, mode, columns), context, prompt))
             else:
                 st.warning("Please enter a prompt.")
 
     # EDA tab
     with tab_eda:
         st.subheader("Visual EDA")
-        for col in num_columns:
-            fig, ax = plt.subplots()
-            sns.histplot(df[col], kde=True, ax=ax)
-            st.pyplot(fig)
-
-        for col in cat_columns:
-            if df[col].nunique() <= 20:
-                fig, ax = plt.subplots()
-                sns.countplot(y=df[col], ax=ax)
-                st.pyplot(fig)
-
-        if len(num_columns) >= 2 and len(cat_columns) >= 1:
-            fig, ax = plt.subplots()
-            sns.scatterplot(x=df[num_columns[0]], y=df[num_columns[1]], hue=df[cat_columns[0]], ax=ax)
-            st.pyplot(fig)
-
-        for date_col in date_columns:
-            for num_col in num_columns:
-                fig, ax = plt.subplots()
-                sns.lineplot(x=df[date_col], y=df[num_col], ax=ax)
-                st.pyplot(fig)
-
-        if len(num_columns) >= 2:
-            fig, ax = plt.subplots(figsize=(10, 8))
-            sns.heatmap(df[num_columns].corr(), annot=True, cmap="coolwarm", ax=ax)
-            st.pyplot(fig)
+        if tab_eda.open:
+            for title, specs in eda_sections(profile):
+                section = st.expander(f"{title} ({len(specs)})", key=f"eda_{title}", on_change="rerun")
+                if section.open:
+                    with section:
+                        n_pages = -(-len(specs) // EDA_PAGE_SIZE)
+                        page = 1
+                        if n_pages > 1:
+                            page = st.number_input(f"Page (of {n_pages})", 1, n_pages, key=f"eda_page_{title}")
+                        page_specs = specs[(page - 1) * EDA_PAGE_SIZE:page * EDA_PAGE_SIZE]
+                        with st.spinner("Drawing charts..."):
+                            for png in chart_pngs(file_hash, columns, page_specs, df):
+                                st.image(png)
+            if correlation is not None:
+                section = st.expander("Correlation", key="eda_Correlation", on_change="rerun")
+                if section.open:
+                    with section:
+                        threshold = st.slider("Show correlations with |r| at least", 0.0, 1.0, 0.3, 0.05)
+                        st.dataframe(correlation["top_pairs"])
+                        png = correlation_png(file_hash, columns, threshold, correlation)
+                        if png is None:
+                            st.info("No pair of columns reaches this threshold.")
+                        else:
+                            st.image(png)
 
     # Statistics tab
     with tab_stats:
-        st.dataframe(df.describe())
+        st.dataframe(profile["statistics"])
 
     # Summary tab
     with tab_summary:
-        st.dataframe(summary_df)
+        st.dataframe(profile["summary"])
 
     # Null Values tab
     with tab_null:
-        st.dataframe(missing_df)
-
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.bar(missing_df['Column'], missing_df['Not Missing Values'], label='Not Missing', color='blue')
-        ax.bar(missing_df['Column'], missing_df['Missing Values'], bottom=missing_df['Not Missing Values'], label='Missing', color='red')
-        ax.set_xticklabels(missing_df['Column'], rotation=45, ha='right')
-        ax.set_ylabel("Count")
-        ax.set_title("Proportion of Missing Values in Each Column")
-        ax.legend()
-        st.pyplot(fig)
+        st.dataframe(profile["missing"])
+        if tab_null.open:
+            st.image(missing_figure(file_hash, mode, columns, profile))
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+# -------------------------------------------------------------------
+# Excel -> Arrow ingest cache
+#
+# The first read of a sheet parses it with pd.read_excel and stores it as
+# an uncompressed Arrow IPC file, keyed by the workbook's content hash and
+# the sheet name. Later reads memory-map that file instead of parsing the
+# workbook again, so only the columns asked for are touched. Editing the
+# workbook changes its hash, so stale caches are never read.
+#
+#   df = read_excel_cached("PA_population_randomized_FY2025.xlsx")
+#   df = read_excel_cached("Hourly - Master_Data.xlsx", columns=["Day", "Hour"])
+#   sheets = read_excel_cached("case_model_sample.xlsx", sheet_name=None)
+# -------------------------------------------------------------------
+
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".excel_cache")
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """sha256 of the file content (hex)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def sheet_cache_path(cache_dir, fingerprint, sheet_name):
+    """Cache file for one sheet of one workbook version."""
+    sheet_key = hashlib.sha1(str(sheet_name).encode("utf-8")).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{fingerprint[:32]}-{sheet_key}.arrow")
+
+
+def manifest_path(cache_dir, fingerprint):
+    """Sheet-name list for one workbook version (used by sheet_name=None)."""
+    return os.path.join(cache_dir, f"{fingerprint[:32]}.json")
+
+
+def arrow_safe_frame(df):
+    """
+    Excel columns often mix numbers and text (IDs, zip codes, 'N/A');
+    Arrow needs one type per column. Mixed object columns are stored as
+    text with blanks kept as nulls; everything else keeps its dtype.
+    """
+    df = df.copy()
+    df.columns = [str(c) for c in df.columns]
+    for col in df.columns[df.dtypes == object]:
+        values = df[col]
+        types = set(values.dropna().map(type))
+        if len(types) > 1:
+            df[col] = values.astype(str).where(values.notna(), None)
+    return df
+
+
+def write_arrow(df, path):
+    """Write df as an uncompressed Arrow IPC file, atomically."""
+    table = pa.Table.from_pandas(arrow_safe_frame(df), preserve_index=False)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp, path)
+
+
+def read_arrow(path, columns=None, as_arrow=False):
+    """
+    Memory-map a cached sheet. Arrow buffers point into the mapped file
+    (zero-copy); only the selected columns are materialized.
+    """
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        table = table.select([str(c) for c in columns])
+    if as_arrow:
+        return table
+    return table.to_pandas()
+
+
+def read_excel_cached(path, sheet_name=0, columns=None, cache_dir=None, as_arrow=False):
+    """
+    Drop-in for pd.read_excel(path, sheet_name) backed by the Arrow cache.
+
+    sheet_name : sheet name or position (as in pd.read_excel), or None for
+                 a dict of all sheets
+    columns    : optional list of columns to load
+    as_arrow   : return pyarrow Tables instead of DataFrames
+    cache_dir  : where cache files live (default .excel_cache next to
+                 this module)
+    """
+    cache_dir = cache_dir or default_cache_dir
+    os.makedirs(cache_dir, exist_ok=True)
+    fingerprint = file_fingerprint(path)
+
+    if sheet_name is None:
+        manifest = manifest_path(cache_dir, fingerprint)
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                names = json.load(f)
+        else:
+            sheets = pd.read_excel(path, sheet_name=None)
+            names = list(sheets)
+            for name, df in sheets.items():
+                write_arrow(df, sheet_cache_path(cache_dir, fingerprint, name))
+            with open(manifest, "w") as f:
+                json.dump(names, f)
+        return {
+            name: read_arrow(sheet_cache_path(cache_dir, fingerprint, name), columns, as_arrow)
+            for name in names
+        }
+
+    cached = sheet_cache_path(cache_dir, fingerprint, sheet_name)
+    if not os.path.exists(cached):
+        write_arrow(pd.read_excel(path, sheet_name=sheet_name), cached)
+    return read_arrow(cached, columns, as_arrow)
+
+
+def clear_excel_cache(cache_dir=None, keep_paths=()):
+    """
+    Remove cache files, except those of the current versions of
+    keep_paths. Returns the number of files removed.
+    """
+    cache_dir = cache_dir or default_cache_dir
+    if not os.path.isdir(cache_dir):
+        return 0
+    keep = {file_fingerprint(p)[:32] for p in keep_paths}
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if name[:32] not in keep:
+            os.remove(os.path.join(cache_dir, name))
+            removed += 1
+    return removed
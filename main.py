@@ -1,6 +1,18 @@
 import pandas as pd
 import numpy as np
 import datetime
+import hashlib
+import heapq
+import os
+import shutil
+import sqlite3
+import time
+import json
+import logging
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor
+
+from excel_cache import read_excel_cached
 
 # -------------------------------------------------------------------
 # Generic helpers
@@ -166,6 +178,355 @@ def likely_match_rule(r1, r2):
     return None
 
 
+# -------------------------------------------------------------------
+# Batch (vectorized) rule evaluation over N pairs
+#
+# Every FN / LN / SSN comparison collapses to one of three states and the
+# DOB comparison to one of four. match_rule / likely_match_rule are then a
+# lookup in a (FN, LN, DOB, SSN) state table.
+# -------------------------------------------------------------------
+
+STATE_EQUAL = 0            # both non-blank and equal
+STATE_NOT_EQUAL = 1        # both non-blank and different
+STATE_BLANK = 2            # at least one side blank
+STATE_EQUAL_ESTIMATED = 3  # DOB only: equal, but one side is estimated
+
+# rule -> (fn_state, ln_state, dob_state, ssn_state)
+strong_rule_states = {
+    0: (STATE_EQUAL, STATE_EQUAL, STATE_EQUAL, STATE_EQUAL),
+    1: (STATE_EQUAL, STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL),
+    2: (STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL, STATE_EQUAL),
+    3: (STATE_NOT_EQUAL, STATE_EQUAL, STATE_EQUAL, STATE_EQUAL),
+    4: (STATE_NOT_EQUAL, STATE_EQUAL, STATE_BLANK, STATE_EQUAL),
+    5: (STATE_EQUAL, STATE_NOT_EQUAL, STATE_BLANK, STATE_EQUAL),
+    6: (STATE_EQUAL, STATE_EQUAL, STATE_BLANK, STATE_EQUAL),
+}
+
+likely_rule_states = {
+    7: (STATE_EQUAL, STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL),
+    8: (STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL, STATE_EQUAL),
+    9: (STATE_NOT_EQUAL, STATE_EQUAL, STATE_EQUAL, STATE_BLANK),
+    10: (STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL, STATE_BLANK),
+    11: (STATE_EQUAL, STATE_EQUAL, STATE_NOT_EQUAL, STATE_BLANK),
+    12: (STATE_NOT_EQUAL, STATE_EQUAL, STATE_NOT_EQUAL, STATE_EQUAL),
+}
+
+
+def build_rule_table(rule_states):
+    """
+    Turn a {rule: (fn, ln, dob, ssn) states} dict into a lookup array
+    indexed by [fn_state, ln_state, dob_state, ssn_state]; -1 = no rule.
+    """
+    table = np.full((3, 3, 4, 3), -1, dtype=np.int8)
+    for rule, states in rule_states.items():
+        table[states] = rule
+    return table
+
+
+strong_rule_table = build_rule_table(strong_rule_states)
+likely_rule_table = build_rule_table(likely_rule_states)
+
+
+def blank_mask(values):
+    """
+    Vectorized is_blank: True for NA / NaT and for empty or
+    whitespace-only strings.
+    """
+    s = pd.Series(values)
+    blank = s.isna().to_numpy(copy=True)
+    if (
+        s.dtype == object
+        or isinstance(s.dtype, pd.CategoricalDtype)
+        or pd.api.types.is_string_dtype(s.dtype)
+    ):
+        nonblank = ~blank
+        blank[nonblank] = s[nonblank].astype(str).str.strip().eq("").to_numpy()
+    return blank
+
+
+def values_equal(a, b):
+    """
+    Element-wise a == b with the same semantics as comparing the scalars.
+    """
+    a = np.asarray(a)
+    b = np.asarray(b)
+    if a.dtype != b.dtype or a.dtype == object:
+        a = a.astype(object)
+        b = b.astype(object)
+    return np.asarray(a == b, dtype=bool)
+
+
+def field_state(a, b):
+    """
+    Comparison state per pair for one of FN / LN / SSN:
+    STATE_EQUAL, STATE_NOT_EQUAL or STATE_BLANK.
+    """
+    blank = blank_mask(a) | blank_mask(b)
+    state = np.where(values_equal(a, b), STATE_EQUAL, STATE_NOT_EQUAL)
+    state[blank] = STATE_BLANK
+    return state.astype(np.int8)
+
+
+def dob_state(dob1, dob2, dob_est1, dob_est2):
+    """
+    Comparison state per pair for DOB, matching dob_is_strict_match /
+    dob_is_strict_not_match:
+    STATE_EQUAL, STATE_NOT_EQUAL, STATE_BLANK or STATE_EQUAL_ESTIMATED.
+    """
+    blank = blank_mask(dob1) | blank_mask(dob2)
+    estimated = (
+        pd.Series(dob_est1).eq("Y").to_numpy()
+        | pd.Series(dob_est2).eq("Y").to_numpy()
+    )
+    equal = values_equal(dob1, dob2)
+    state = np.where(
+        equal,
+        np.where(estimated, STATE_EQUAL_ESTIMATED, STATE_EQUAL),
+        STATE_NOT_EQUAL,
+    )
+    state[blank] = STATE_BLANK
+    return state.astype(np.int8)
+
+
+def pair_states(r1, r2):
+    """
+    r1, r2 are tuples of column arrays for both sides of N pairs:
+    (first_name, last_name, dob, ssn, dob_est_flag).
+    Returns the (fn, ln, dob, ssn) state arrays.
+    """
+    fn1, ln1, dob1, ssn1, dob_est1 = r1
+    fn2, ln2, dob2, ssn2, dob_est2 = r2
+    return (
+        field_state(fn1, fn2),
+        field_state(ln1, ln2),
+        dob_state(dob1, dob2, dob_est1, dob_est2),
+        field_state(ssn1, ssn2),
+    )
+
+
+def match_rule_batch(r1, r2, states=None):
+    """
+    Batch version of match_rule over N pairs.
+    r1, r2 are tuples of column arrays: (first_name, last_name, dob, ssn, dob_est_flag)
+    Returns an int8 array of rule numbers 0–6, or -1 for no strong match.
+    """
+    if states is None:
+        states = pair_states(r1, r2)
+    return strong_rule_table[states]
+
+
+def likely_match_rule_batch(r1, r2, states=None):
+    """
+    Batch version of likely_match_rule over N pairs.
+    r1, r2 are tuples of column arrays: (first_name, last_name, dob, ssn, dob_est_flag)
+    Returns an int8 array of rule numbers 7–12, or -1 for no likely match.
+    """
+    if states is None:
+        states = pair_states(r1, r2)
+    return likely_rule_table[states]
+
+
+# -------------------------------------------------------------------
+# One-time normalization pre-pass: integer-coded identity fields
+#
+# FN / LN / DOB / SSN are factorized once per frame into int32 codes
+# (-1 = blank), with one vocabulary shared by the perp_* and relative_*
+# columns. Equality of two codes is exactly `a == b` on the raw values,
+# so rule states become integer compares on the hot path.
+# -------------------------------------------------------------------
+
+identity_columns = {
+    "main": {
+        "fn": "perp_first_name",
+        "ln": "perp_last_name",
+        "dob": "perp_date_of_birth",
+        "ssn": "perp_social_security_number",
+        "dob_est": "perp_date_of_birth_estimated",
+    },
+    "relatives": {
+        "fn": "relative_first_name",
+        "ln": "relative_last_name",
+        "dob": "relative_date_of_birth",
+        "ssn": "relative_social_security_number",
+        "dob_est": "relative_date_of_birth_estimated",
+    },
+}
+
+
+def normalize_identity_text(s):
+    """Optional name / SSN folding: upper-case, collapse whitespace, drop '-'."""
+    s = pd.Series(s)
+    text = s.astype(str).str.upper().str.replace("-", "", regex=False)
+    text = text.str.replace(r"\s+", " ", regex=True).str.strip()
+    return text.where(s.notna() & (s.map(type) == str), s)
+
+
+def encode_identity_fields(df=None, df_rel=None, normalize=False):
+    """
+    Pre-pass over the main and / or relatives table.
+
+    Returns {"main": codes, "relatives": codes} (only for the tables
+    given), where codes is a dict of arrays per row:
+      - fn, ln, dob, ssn : int32 codes, -1 where blank (is_blank)
+      - dob_est          : bool, dob_est_flag == 'Y'
+
+    Codes are shared across both tables. With normalize=True names and
+    SSNs are first folded with normalize_identity_text; that changes
+    which pairs count as equal, so the default keeps exact matching.
+    """
+    tables = {"main": df, "relatives": df_rel}
+    tables = {name: t for name, t in tables.items() if t is not None}
+
+    encoded = {name: {} for name in tables}
+    for field in ["fn", "ln", "dob", "ssn"]:
+        parts = [tables[name][identity_columns[name][field]] for name in tables]
+        values = pd.concat(parts, ignore_index=True)
+        if normalize and field != "dob":
+            values = normalize_identity_text(values)
+
+        codes, _ = pd.factorize(values)
+        codes = codes.astype(np.int32)
+        codes[blank_mask(values)] = -1
+
+        start = 0
+        for name, part in zip(tables, parts):
+            encoded[name][field] = codes[start:start + len(part)]
+            start += len(part)
+
+    for name, t in tables.items():
+        encoded[name]["dob_est"] = (
+            t[identity_columns[name]["dob_est"]].eq("Y").to_numpy(dtype=bool)
+        )
+    return encoded
+
+
+def take_codes(codes, pos):
+    """Row subset of an encode_identity_fields code dict."""
+    return {field: arr[pos] for field, arr in codes.items()}
+
+
+def code_state(c1, c2):
+    """STATE_EQUAL / STATE_NOT_EQUAL / STATE_BLANK from two code arrays."""
+    state = np.where(c1 == c2, STATE_EQUAL, STATE_NOT_EQUAL).astype(np.int8)
+    state[(c1 < 0) | (c2 < 0)] = STATE_BLANK
+    return state
+
+
+def code_pair_states(left, right):
+    """
+    pair_states on encoded fields: left / right are code dicts for both
+    sides of N pairs. Returns the (fn, ln, dob, ssn) state arrays.
+    """
+    dob = code_state(left["dob"], right["dob"])
+    estimated = left["dob_est"] | right["dob_est"]
+    dob[(dob == STATE_EQUAL) & estimated] = STATE_EQUAL_ESTIMATED
+    return (
+        code_state(left["fn"], right["fn"]),
+        code_state(left["ln"], right["ln"]),
+        dob,
+        code_state(left["ssn"], right["ssn"]),
+    )
+
+
+# -------------------------------------------------------------------
+# Optional instrumentation: stage timings and counters
+#
+# Everything that records stats takes stats=None; with None the hot
+# paths skip the bookkeeping entirely.
+# -------------------------------------------------------------------
+
+class ReoccurrenceStats:
+    """
+    Timings and counters for one add_perp_reoccurrence_flag run.
+
+    Create one, pass it as stats=..., and read it afterwards:
+
+        stats = ReoccurrenceStats()
+        add_perp_reoccurrence_flag(df, df_rel, df_add, stats=stats)
+        stats.as_dict()
+
+    timings  : seconds per stage (grouping, pair_enumeration, encoding,
+               rule_evaluation, index_build, confirmation,
+               relatives_lookup, address_lookup, output, total)
+    counters : groups_seen, groups_pruned, pairs, likely_candidates,
+               relationship_lookups, relationship_cache_hits,
+               address_lookups, confirmed_relationship,
+               confirmed_address, flagged_strong, flagged_likely
+    strong_rule_hits / likely_rule_hits : pairs hitting each rule number
+
+    sink receives the finished stats (emit is called at the end of the
+    run): a logging.Logger (one INFO line), a path (one JSON line
+    appended per run) or any callable taking the as_dict() result.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.timings = {}
+        self.counters = {}
+        self.strong_rule_hits = {}
+        self.likely_rule_hits = {}
+
+    def add(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + int(n)
+
+    def add_time(self, stage, seconds):
+        self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def timer(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def add_rule_hits(self, hits, rules):
+        """Count rule numbers (>= 0) from a rule array into `hits`."""
+        rules = rules[rules >= 0]
+        for rule, n in enumerate(np.bincount(rules)):
+            if n:
+                hits[rule] = hits.get(rule, 0) + int(n)
+
+    def merge(self, other):
+        """Add another ReoccurrenceStats (or its as_dict()) into this one."""
+        if isinstance(other, ReoccurrenceStats):
+            other = other.as_dict()
+        for stage, seconds in other["timings"].items():
+            self.add_time(stage, seconds)
+        for name, n in other["counters"].items():
+            self.add(name, n)
+        for key, hits in [("strong_rule_hits", self.strong_rule_hits),
+                          ("likely_rule_hits", self.likely_rule_hits)]:
+            for rule, n in other[key].items():
+                hits[int(rule)] = hits.get(int(rule), 0) + n
+
+    def as_dict(self):
+        return {
+            "timings": {k: round(v, 6) for k, v in self.timings.items()},
+            "counters": dict(self.counters),
+            "strong_rule_hits": dict(sorted(self.strong_rule_hits.items())),
+            "likely_rule_hits": dict(sorted(self.likely_rule_hits.items())),
+        }
+
+    def emit(self):
+        """Send the stats to the sink, if any."""
+        if self.sink is None:
+            return
+        data = self.as_dict()
+        if isinstance(self.sink, logging.Logger):
+            self.sink.info("perp reoccurrence stats: %s", json.dumps(data))
+        elif isinstance(self.sink, (str, os.PathLike)):
+            with open(self.sink, "a") as f:
+                f.write(json.dumps(data) + "\n")
+        else:
+            self.sink(data)
+
+
+def stage_timer(stats, stage):
+    """stats.timer(stage), or a no-op context when stats is None."""
+    return nullcontext() if stats is None else stats.timer(stage)
+
+
 # -------------------------------------------------------------------
 # Relationship / address helpers for likely matches
 # -------------------------------------------------------------------
@@ -179,15 +540,90 @@ allowed_relationships = [
 ]
 
 
+class RelativesIndex:
+    """
+    One-time index over the relatives table, keyed by
+    (referral_id, relative_relationship).
+
+    Relatives are held as compact column arrays and every key maps to the
+    row positions of its relatives, so a lookup never scans df_rel.
+    """
+
+    columns = [
+        "relative_first_name",
+        "relative_last_name",
+        "relative_date_of_birth",
+        "relative_social_security_number",
+        "relative_date_of_birth_estimated",
+    ]
+
+    def __init__(self, df_rel, codes=None):
+        # (fn, ln, dob, ssn, dob_est) arrays, same order as match_rule tuples
+        self.values = tuple(df_rel[c].to_numpy() for c in self.columns)
+        # integer-coded fields, e.g. encode_identity_fields(df, df_rel)["relatives"]
+        if codes is None:
+            codes = encode_identity_fields(df_rel=df_rel)["relatives"]
+        self.codes = codes
+        self.groups = (
+            df_rel.groupby(["referral_id", "relative_relationship"], sort=False, observed=True)
+            .indices
+        )
+        self.strong_match_cache = {}
+
+    def relatives(self, referral_id, relationship):
+        """Return the (fn, ln, dob, ssn, dob_est) tuples for that key."""
+        pos = self.groups.get((referral_id, relationship))
+        if pos is None:
+            return []
+        return list(zip(*(col[pos] for col in self.values)))
+
+    def has_strong_match(self, referral_id1, referral_id2, relationship):
+        """
+        True if any relative of referral 1 is a strong match (rules 0-6)
+        for any relative of referral 2 with the same relationship.
+
+        Every strong rule needs SSN=, so only relatives that share an SSN
+        code are paired up and run through the strong rule table.
+        """
+        cache_key = (referral_id1, referral_id2, relationship)
+        cached = self.strong_match_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        found = False
+        pos1 = self.groups.get((referral_id1, relationship))
+        pos2 = self.groups.get((referral_id2, relationship))
+        if pos1 is not None and pos2 is not None:
+            ssn = self.codes["ssn"]
+            pos1 = pos1[(ssn[pos1] >= 0) & np.isin(ssn[pos1], ssn[pos2])]
+            if len(pos1):
+                pos2 = pos2[np.isin(ssn[pos2], ssn[pos1])]
+                left = np.repeat(pos1, len(pos2))
+                right = np.tile(pos2, len(pos1))
+                same_ssn = ssn[left] == ssn[right]
+                states = code_pair_states(
+                    take_codes(self.codes, left[same_ssn]),
+                    take_codes(self.codes, right[same_ssn]),
+                )
+                found = bool((strong_rule_table[states] >= 0).any())
+
+        self.strong_match_cache[cache_key] = found
+        return found
+
+
 def relatives_for_referral(df_rel, referral_id, relationship):
     """
     Return a list of (fn, ln, dob, ssn, dob_est) tuples for relatives
     in df_rel for that referral and relationship.
+    df_rel can be the relatives table or a prebuilt RelativesIndex.
     """
+    if isinstance(df_rel, RelativesIndex):
+        return df_rel.relatives(referral_id, relationship)
+
     rel = df_rel[
         (df_rel["referral_id"] == referral_id) &
         (df_rel["relative_relationship"] == relationship)
-    ].copy()
+    ]
 
     if rel.empty:
         return []
@@ -203,11 +639,111 @@ def relatives_for_referral(df_rel, referral_id, relationship):
     )
 
 
+street_suffix_abbreviations = {
+    "STREET": "ST", "AVENUE": "AVE", "ROAD": "RD", "DRIVE": "DR",
+    "LANE": "LN", "BOULEVARD": "BLVD", "COURT": "CT", "PLACE": "PL",
+    "TERRACE": "TER", "CIRCLE": "CIR", "HIGHWAY": "HWY", "PARKWAY": "PKWY",
+    "SQUARE": "SQ", "TRAIL": "TRL", "APARTMENT": "APT", "SUITE": "STE",
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+}
+
+street_suffix_pattern = r"\b(" + "|".join(street_suffix_abbreviations) + r")\b"
+
+
+def normalize_address_part(s):
+    """
+    Shared address normalization: upper-case, drop '.' and ',', collapse
+    whitespace and abbreviate street suffixes / directions
+    ('123 Main Street' -> '123 MAIN ST'). Blank -> ''.
+    """
+    s = pd.Series(s).astype(object).where(lambda x: x.notna(), "").astype(str)
+    s = (
+        s.str.upper()
+         .str.replace(r"[.,]", " ", regex=True)
+         .str.replace(r"\s+", " ", regex=True)
+         .str.strip()
+    )
+    return s.str.replace(
+        street_suffix_pattern,
+        lambda m: street_suffix_abbreviations[m.group(1)],
+        regex=True,
+    )
+
+
+def normalize_zip(s):
+    """Zip codes as text without surrounding whitespace or a float '.0'."""
+    s = pd.Series(s).astype(object).where(lambda x: x.notna(), "").astype(str)
+    return s.str.strip().str.replace(r"\.0$", "", regex=True)
+
+
+class AddressIndex:
+    """
+    One-time index over the address table:
+    referral_id -> normalized 'Primary' address.
+
+    Every referral keeps its first Primary address (table order). The
+    normalized address_key is factorized into an integer address_code, so
+    two referrals share an address iff their codes are equal. Only a
+    missing Address Line 1 leaves a referral without a code; blank lines
+    still match on city and zip.
+    Used by both confirm_likely_match and add_perp_in_family_and_address_flags.
+    """
+
+    def __init__(self, df_add):
+        add_prim = df_add[
+            df_add["Address Type"].astype(str).str.strip().str.lower() == "primary"
+        ]
+        add_prim = add_prim.drop_duplicates("Referral ID")
+        add_prim = add_prim[add_prim["Referral ID"].notna()]
+
+        table = pd.DataFrame({
+            "Referral ID": add_prim["Referral ID"].to_numpy(),
+            "Address Line 1": add_prim["Address Line 1"].to_numpy(),
+            "City": add_prim["City"].to_numpy(),
+            "Zip Code": add_prim["Zip Code"].to_numpy(),
+        })
+
+        line1 = normalize_address_part(table["Address Line 1"])
+        table["address_key"] = (
+            line1
+            + "|"
+            + normalize_address_part(table["City"])
+            + "|"
+            + normalize_zip(table["Zip Code"])
+        )
+        # A missing street line means no address (as the baseline flag's
+        # isna() check); a blank one still compares, as raw tuples did
+        table.loc[table["Address Line 1"].isna().to_numpy(), "address_key"] = np.nan
+
+        codes, _ = pd.factorize(table["address_key"])   # NaN -> -1
+        table["address_code"] = codes
+
+        self.table = table
+        self.codes = dict(zip(table["Referral ID"], table["address_code"]))
+
+    def address_code(self, referral_id):
+        """Integer code of the normalized primary address, or None."""
+        code = self.codes.get(referral_id, -1)
+        return None if code < 0 else code
+
+    def primary_address(self, referral_id):
+        """Raw (address_line_1, city, zip) of the primary address, or None."""
+        match = self.table[self.table["Referral ID"] == referral_id]
+        if match.empty:
+            return None
+        row = match.iloc[0]
+        return (row["Address Line 1"], row["City"], row["Zip Code"])
+
+
 def primary_address_for_referral(df_add, referral_id):
     """
     Return (address_line_1, city, zip) for the 'Primary' address
     in the address table, or None if not found.
+    df_add can be the address table or a prebuilt AddressIndex.
     """
+    if isinstance(df_add, AddressIndex):
+        return df_add.primary_address(referral_id)
+
     add = df_add[
         (df_add["Referral ID"] == referral_id) &
         (df_add["Address Type"].str.lower() == "primary")
@@ -224,7 +760,7 @@ def primary_address_for_referral(df_add, referral_id):
     )
 
 
-def confirm_likely_match(row1, row2, rule, df_rel, df_add):
+def confirm_likely_match(row1, row2, rule, df_rel, df_add, stats=None):
     """
     Extra confirmation step for likely matches 7-12.
 
@@ -232,6 +768,11 @@ def confirm_likely_match(row1, row2, rule, df_rel, df_add):
       - 'relationship' if confirmed via family/relative match
       - 'address'     if confirmed via address match
       - None          if not confirmed
+
+    df_rel / df_add can be the raw tables or a RelativesIndex /
+    AddressIndex built once by the caller. Addresses are compared on the
+    shared normalized address key.
+    stats (ReoccurrenceStats) counts the lookups, cache hits and their time.
     """
     relationship1 = row1.get("perp_relationship")
     relationship2 = row2.get("perp_relationship")
@@ -242,29 +783,443 @@ def confirm_likely_match(row1, row2, rule, df_rel, df_add):
         and relationship1 in allowed_relationships
         and df_rel is not None
     ):
-        rels1 = relatives_for_referral(df_rel, row1["referral_id"], relationship1)
-        rels2 = relatives_for_referral(df_rel, row2["referral_id"], relationship2)
-
-        for r1 in rels1:
-            for r2 in rels2:
-                if match_rule(r1, r2) is not None:   # any strong rule 0-6
-                    return True, "relationship"
+        if not isinstance(df_rel, RelativesIndex):
+            df_rel = RelativesIndex(df_rel)
+
+        # any strong rule 0-6 between relatives of the two referrals
+        if stats is None:
+            found = df_rel.has_strong_match(row1["referral_id"], row2["referral_id"], relationship1)
+        else:
+            start = time.perf_counter()
+            cache_key = (row1["referral_id"], row2["referral_id"], relationship1)
+            stats.add("relationship_lookups")
+            stats.add("relationship_cache_hits", cache_key in df_rel.strong_match_cache)
+            found = df_rel.has_strong_match(*cache_key)
+            stats.add_time("relatives_lookup", time.perf_counter() - start)
+        if found:
+            return True, "relationship"
 
     # Address-based confirmation
     if df_add is not None:
-        addr1 = primary_address_for_referral(df_add, row1["referral_id"])
-        addr2 = primary_address_for_referral(df_add, row2["referral_id"])
-        if addr1 and addr2 and addr1 == addr2:
+        if not isinstance(df_add, AddressIndex):
+            df_add = AddressIndex(df_add)
+
+        if stats is not None:
+            start = time.perf_counter()
+        addr1 = df_add.address_code(row1["referral_id"])
+        addr2 = df_add.address_code(row2["referral_id"])
+        if stats is not None:
+            stats.add("address_lookups")
+            stats.add_time("address_lookup", time.perf_counter() - start)
+        if addr1 is not None and addr1 == addr2:
             return True, "address"
 
     return False, None
 
 
+# -------------------------------------------------------------------
+# Candidate pairs: index-CSA row x Subsequent row
+# -------------------------------------------------------------------
+
+def index_csa_subsequent_masks(df):
+    """
+    Boolean arrays (is_index_csa, is_subseq) per row of df:
+    - is_index_csa: is_index == 'Y' and subcategory_of_abuse == 'Child Sexually Acting Out'
+    - is_subseq:    referral_sequence_type == 'Subsequent'
+    """
+    is_index_csa = (
+        (df["is_index"] == "Y")
+        & (df["subcategory_of_abuse"] == "Child Sexually Acting Out")
+    )
+    is_subseq = df["referral_sequence_type"] == "Subsequent"
+    return is_index_csa.to_numpy(dtype=bool), is_subseq.to_numpy(dtype=bool)
+
+
+def index_csa_subsequent_pairs(df, group_cols=("long_person_id", "person_id"), stats=None):
+    """
+    Build the candidate pairs that add_perp_reoccurrence_flag has to check,
+    using a self-merge on the group keys instead of walking every row pair.
+
+    A pair is (index-CSA row, Subsequent row) inside the same
+    (long_person_id, person_id) group with a different referral_id.
+    Groups without at least one index-CSA row and one Subsequent row are
+    dropped before any pairs are built.
+
+    Returns a DataFrame with columns:
+      - index_pos : positional row number of the index-CSA row in df
+      - later_pos : positional row number of the Subsequent row in df
+    sorted by (later_pos, index_pos), which is the order the old nested
+    loop visited the pairs of each Subsequent row.
+    stats (ReoccurrenceStats) records groups seen / pruned and pair counts.
+    """
+    group_cols = list(group_cols)
+
+    with stage_timer(stats, "grouping"):
+        is_index_csa, is_subseq = index_csa_subsequent_masks(df)
+
+        base = pd.DataFrame({c: df[c].to_numpy() for c in group_cols})
+        base["pos"] = np.arange(len(df))
+        base["referral_id"] = df["referral_id"].to_numpy()
+        base["is_index_csa"] = is_index_csa
+        base["is_subseq"] = is_subseq
+
+        # groupby skips rows with a blank group key, merge would not
+        base = base[base[group_cols].notna().all(axis=1)]
+        base = base[base["is_index_csa"] | base["is_subseq"]]
+
+        # Prune groups that can never produce a pair
+        grp = base.groupby(group_cols, sort=False)
+        keep = grp["is_index_csa"].transform("any") & grp["is_subseq"].transform("any")
+        if stats is not None:
+            kept = grp[["is_index_csa", "is_subseq"]].any().all(axis=1).sum()
+            stats.add("groups_seen", grp.ngroups)
+            stats.add("groups_pruned", grp.ngroups - kept)
+        base = base[keep]
+
+    with stage_timer(stats, "pair_enumeration"):
+        index_rows = base.loc[base["is_index_csa"], group_cols + ["pos", "referral_id", "is_subseq"]]
+        later_rows = base.loc[base["is_subseq"], group_cols + ["pos", "referral_id", "is_index_csa"]]
+        index_rows = index_rows.rename(columns={"is_subseq": "index_is_subseq"})
+        later_rows = later_rows.rename(columns={"is_index_csa": "later_is_index_csa"})
+
+        pairs = index_rows.merge(later_rows, on=group_cols, suffixes=("_index", "_later"))
+
+        # Must be different referrals (referral-level, not row-level)
+        pairs = pairs[
+            (pairs["pos_index"] != pairs["pos_later"])
+            & (pairs["referral_id_index"] != pairs["referral_id_later"])
+        ]
+
+        # If both rows are index-CSA *and* Subsequent, the pair was only ever
+        # checked once, with the earlier row as the index side.
+        both_ways = pairs["index_is_subseq"] & pairs["later_is_index_csa"]
+        pairs = pairs[~both_ways | (pairs["pos_index"] < pairs["pos_later"])]
+
+        pairs = (
+            pairs[["pos_index", "pos_later"]]
+            .rename(columns={"pos_index": "index_pos", "pos_later": "later_pos"})
+            .sort_values(["later_pos", "index_pos"], kind="mergesort")
+            .reset_index(drop=True)
+        )
+
+    if stats is not None:
+        stats.add("pairs", len(pairs))
+    return pairs
+
+
 # -------------------------------------------------------------------
 # Main function: add perp_reoccurrence_flag(Y/N) + metadata
 # -------------------------------------------------------------------
 
-def add_perp_reoccurrence_flag(df, df_rel=None, df_add=None):
+reoccurrence_group_cols = ["long_person_id", "person_id"]
+
+reoccurrence_needed_cols = reoccurrence_group_cols + [
+    "is_index",
+    "referral_sequence_type",
+    "subcategory_of_abuse",
+    "referral_id",
+    "perp_first_name",
+    "perp_last_name",
+    "perp_date_of_birth",
+    "perp_date_of_birth_estimated",
+    "perp_social_security_number",
+    "perp_relationship",
+]
+
+reoccurrence_output_cols = [
+    "perp_reoccurrence_flag",
+    "perp_reoccurrence_match_type",
+    "perp_reoccurrence_rule",
+    "perp_reoccurrence_confirm_type",
+]
+
+
+def empty_reoccurrence_columns(index):
+    """The perp_reoccurrence_* columns with nothing flagged yet."""
+    n = len(index)
+    return pd.DataFrame({
+        "perp_reoccurrence_flag": "N",
+        "perp_reoccurrence_match_type": np.full(n, np.nan, dtype=object),
+        "perp_reoccurrence_rule": np.full(n, np.nan),
+        "perp_reoccurrence_confirm_type": np.full(n, np.nan, dtype=object),
+    }, index=index)
+
+
+def perp_reoccurrence_columns(df, df_rel=None, df_add=None, stats=None):
+    """
+    Matching core of add_perp_reoccurrence_flag: returns only the four
+    perp_reoccurrence_* columns, indexed like df.
+    df_rel / df_add can be the raw tables or a RelativesIndex / AddressIndex.
+    stats (ReoccurrenceStats) collects per-stage timings and counters.
+    """
+    out = empty_reoccurrence_columns(df.index)
+
+    pairs = index_csa_subsequent_pairs(df, stats=stats)
+    if pairs.empty:
+        return out
+
+    index_pos = pairs["index_pos"].to_numpy()
+    later_pos = pairs["later_pos"].to_numpy()
+
+    # Step 1 + 2: strong / likely rule for every pair at once, on codes
+    # from a single encoding pass over df
+    with stage_timer(stats, "encoding"):
+        codes = encode_identity_fields(df)["main"]
+    with stage_timer(stats, "rule_evaluation"):
+        states = code_pair_states(take_codes(codes, index_pos), take_codes(codes, later_pos))
+        strong = strong_rule_table[states]
+        likely = likely_rule_table[states]
+    if stats is not None:
+        stats.add_rule_hits(stats.strong_rule_hits, strong)
+        stats.add_rule_hits(stats.likely_rule_hits, likely)
+
+    referral_ids = df["referral_id"].to_numpy()
+    relationships = df["perp_relationship"].to_numpy()
+
+    # per-row classification for summary
+    match_type_map = {}        # pos -> 'strong' or 'likely'
+    match_rule_map = {}        # pos -> rule number
+    confirm_type_map = {}      # pos -> 'relationship' / 'address' / None
+
+    # Pairs are ordered by (later_pos, index_pos), so the first hit for a
+    # Subsequent row is the one the old nested loop would have kept.
+    # A strong hit always wins over likely ones (likely -> strong upgrade).
+    is_strong = strong >= 0
+    first_strong = pd.DataFrame({
+        "later_pos": later_pos[is_strong],
+        "rule": strong[is_strong],
+    }).drop_duplicates("later_pos")
+
+    for l_pos, rule in zip(first_strong["later_pos"], first_strong["rule"]):
+        match_type_map[l_pos] = "strong"
+        match_rule_map[l_pos] = int(rule)
+        confirm_type_map[l_pos] = None
+
+    # Likely matches only matter for Subsequent rows without a strong hit
+    is_likely = (likely >= 0) & ~np.isin(later_pos, first_strong["later_pos"].to_numpy())
+
+    if stats is not None:
+        stats.add("likely_candidates", is_likely.sum())
+
+    # Index the relatives / address tables once instead of scanning them per candidate
+    if is_likely.any():
+        with stage_timer(stats, "index_build"):
+            if df_rel is not None and not isinstance(df_rel, RelativesIndex):
+                df_rel = RelativesIndex(df_rel)
+            if df_add is not None and not isinstance(df_add, AddressIndex):
+                df_add = AddressIndex(df_add)
+
+    confirmation_start = time.perf_counter()
+    for i_pos, l_pos, lk_rule in zip(index_pos[is_likely], later_pos[is_likely], likely[is_likely]):
+        prev_type = match_type_map.get(l_pos)
+
+        # same type: keep existing rule; nothing beats a relationship
+        # confirmation, so stop checking once we have one
+        if prev_type == "likely" and confirm_type_map[l_pos] == "relationship":
+            continue
+
+        row_index = {"referral_id": referral_ids[i_pos], "perp_relationship": relationships[i_pos]}
+        row_later = {"referral_id": referral_ids[l_pos], "perp_relationship": relationships[l_pos]}
+        confirmed, confirm_type = confirm_likely_match(
+            row_index, row_later, int(lk_rule), df_rel, df_add, stats
+        )
+        if not confirmed:
+            continue
+        if stats is not None:
+            stats.add("confirmed_" + confirm_type)
+
+        if prev_type is None:
+            match_type_map[l_pos] = "likely"
+            match_rule_map[l_pos] = int(lk_rule)
+            confirm_type_map[l_pos] = confirm_type
+        elif confirm_type == "relationship":
+            confirm_type_map[l_pos] = "relationship"
+
+    if stats is not None:
+        stats.add_time("confirmation", time.perf_counter() - confirmation_start)
+        stats.add("flagged_strong", len(first_strong))
+        stats.add("flagged_likely", len(match_type_map) - len(first_strong))
+        output_start = time.perf_counter()
+
+    if match_type_map:
+        pos = np.fromiter(match_type_map.keys(), dtype=np.int64)
+        flag = out["perp_reoccurrence_flag"].to_numpy(copy=True)
+        match_type = out["perp_reoccurrence_match_type"].to_numpy(copy=True)
+        rule_col = out["perp_reoccurrence_rule"].to_numpy(copy=True)
+        confirm_col = out["perp_reoccurrence_confirm_type"].to_numpy(copy=True)
+
+        flag[pos] = "Y"
+        match_type[pos] = [match_type_map[p] for p in pos]
+        rule_col[pos] = [match_rule_map[p] for p in pos]
+        confirm_col[pos] = [
+            np.nan if confirm_type_map[p] is None else confirm_type_map[p] for p in pos
+        ]
+
+        out["perp_reoccurrence_flag"] = flag
+        out["perp_reoccurrence_match_type"] = match_type
+        out["perp_reoccurrence_rule"] = rule_col
+        out["perp_reoccurrence_confirm_type"] = confirm_col
+
+    if stats is not None:
+        stats.add_time("output", time.perf_counter() - output_start)
+    return out
+
+
+# -------------------------------------------------------------------
+# Parallel mode: shards of whole long_person_id groups in a process pool
+# -------------------------------------------------------------------
+
+def reoccurrence_shards(df, n_shards):
+    """
+    Split the rows of df that can take part in a pair into at most
+    n_shards arrays of row positions.
+
+    A long_person_id is never split across shards (all matching happens
+    inside one (long_person_id, person_id) group). Shards are balanced on
+    the candidate-pair count (index-CSA rows x Subsequent rows per group),
+    heaviest long_person_id first onto the lightest shard.
+    """
+    is_index_csa, is_subseq = index_csa_subsequent_masks(df)
+
+    keys = pd.DataFrame({c: df[c].to_numpy() for c in reoccurrence_group_cols})
+    keys["n_index_csa"] = is_index_csa
+    keys["n_subseq"] = is_subseq
+
+    per_group = keys.groupby(reoccurrence_group_cols).sum()
+    per_group["weight"] = per_group["n_index_csa"] * per_group["n_subseq"]
+
+    weight = per_group.groupby(level=0)["weight"].sum()
+    weight = weight[weight > 0].sort_values(ascending=False, kind="mergesort")
+
+    loads = [(0, i) for i in range(n_shards)]
+    shard_of = {}
+    for long_person_id, w in weight.items():
+        load, i = heapq.heappop(loads)
+        shard_of[long_person_id] = i
+        heapq.heappush(loads, (load + w, i))
+
+    row_shard = df["long_person_id"].map(shard_of).to_numpy(dtype=float)
+    shards = [np.flatnonzero(row_shard == i) for i in range(n_shards)]
+    return [pos for pos in shards if len(pos)]
+
+
+# Set once per worker process by init_reoccurrence_worker
+reoccurrence_worker_state = {}
+
+
+def init_reoccurrence_worker(df_rel, df_add):
+    """Process-pool initializer: receive the relatives / address indexes once."""
+    reoccurrence_worker_state["df_rel"] = df_rel
+    reoccurrence_worker_state["df_add"] = df_add
+
+
+def reoccurrence_worker(shard, collect_stats=False):
+    """
+    Run the matching core on one shard inside a worker process.
+    With collect_stats the shard's ReoccurrenceStats.as_dict() comes back
+    under "stats".
+    """
+    stats = ReoccurrenceStats() if collect_stats else None
+    out = perp_reoccurrence_columns(
+        shard,
+        reoccurrence_worker_state.get("df_rel"),
+        reoccurrence_worker_state.get("df_add"),
+        stats,
+    )
+    result = {c: out[c].to_numpy() for c in reoccurrence_output_cols}
+    if stats is not None:
+        result["stats"] = stats.as_dict()
+    return result
+
+
+def perp_reoccurrence_columns_parallel(df, df_rel=None, df_add=None, n_jobs=-1, stats=None):
+    """
+    Parallel version of perp_reoccurrence_columns.
+
+    The frame is cut into balanced shards of whole long_person_id groups
+    (reoccurrence_shards) and run in a process pool. The relatives and
+    address tables are indexed once here and handed to each worker once
+    through the pool initializer, not pickled per task. Results are merged
+    back by row position in shard order, so the output does not depend on
+    which worker finishes first.
+    Worker stats are summed into stats, so stage timings are CPU seconds
+    across workers rather than wall time, and groups_seen / groups_pruned
+    only count groups in shards (sharding already drops the rest).
+    """
+    if n_jobs is None or n_jobs < 1:
+        n_jobs = os.cpu_count() or 1
+
+    with stage_timer(stats, "index_build"):
+        if df_rel is not None and not isinstance(df_rel, RelativesIndex):
+            df_rel = RelativesIndex(df_rel)
+        if df_add is not None and not isinstance(df_add, AddressIndex):
+            df_add = AddressIndex(df_add)
+
+    out = empty_reoccurrence_columns(df.index)
+
+    # a few shards per worker keeps the pool busy when group sizes are skewed
+    with stage_timer(stats, "sharding"):
+        shards = reoccurrence_shards(df, n_jobs * 4)
+    if not shards:
+        return out
+
+    projected = df[reoccurrence_needed_cols]
+    results = {c: out[c].to_numpy(copy=True) for c in reoccurrence_output_cols}
+
+    with ProcessPoolExecutor(
+        max_workers=min(n_jobs, len(shards)),
+        initializer=init_reoccurrence_worker,
+        initargs=(df_rel, df_add),
+    ) as executor:
+        futures = [
+            executor.submit(reoccurrence_worker, projected.iloc[pos], stats is not None)
+            for pos in shards
+        ]
+        for pos, future in zip(shards, futures):
+            shard_out = future.result()
+            for c in reoccurrence_output_cols:
+                results[c][pos] = shard_out[c]
+            if stats is not None:
+                stats.merge(shard_out["stats"])
+
+    for c in reoccurrence_output_cols:
+        out[c] = results[c]
+    return out
+
+
+def reoccurrence_flag_columns(df, df_rel=None, df_add=None, n_jobs=1, stats=None):
+    """
+    Copy-free form of add_perp_reoccurrence_flag: returns only the four
+    perp_reoccurrence_* columns, aligned on df.index. df itself is never
+    copied; only the columns the matching needs are read.
+    """
+    missing = [c for c in reoccurrence_needed_cols if c not in df.columns]
+    if missing:
+        raise ValueError(f"df must contain columns: {missing}")
+
+    with stage_timer(stats, "total"):
+        if n_jobs == 1:
+            new_cols = perp_reoccurrence_columns(df, df_rel, df_add, stats)
+        else:
+            new_cols = perp_reoccurrence_columns_parallel(df, df_rel, df_add, n_jobs, stats)
+
+    if stats is not None:
+        stats.emit()
+    return new_cols
+
+
+def with_columns(df, new_cols):
+    """
+    Materialize a combined frame: a copy of df with the columns of
+    new_cols (aligned on df.index) added or replaced.
+    """
+    df = df.copy()
+    for c in new_cols.columns:
+        df[c] = new_cols[c].to_numpy()
+    return df
+
+
+def add_perp_reoccurrence_flag(df, df_rel=None, df_add=None, n_jobs=1, stats=None):
     """
     For each (long_person_id, person_id):
 
@@ -282,175 +1237,802 @@ def add_perp_reoccurrence_flag(df, df_rel=None, df_add=None):
       - perp_reoccurrence_match_type  ('strong' / 'likely')
       - perp_reoccurrence_rule        (0–12)
       - perp_reoccurrence_confirm_type ('relationship' / 'address' / NaN)
+
+    n_jobs > 1 (or -1 for all cores) runs the matching in a process pool,
+    sharded by long_person_id; the result is the same as n_jobs=1.
+
+    stats: optional ReoccurrenceStats, filled in with stage timings and
+    counters (and sent to its sink) -- off by default.
+
+    Returns a copy of df with the new columns; reoccurrence_flag_columns
+    returns the new columns alone.
     """
+    return with_columns(df, reoccurrence_flag_columns(df, df_rel, df_add, n_jobs, stats))
+
+
+# -------------------------------------------------------------------
+# Compact dtype schema for the main / relatives / address tables
+#
+#   category : low-cardinality text (flags, sequence type, relationships)
+#   datetime : DOBs, mixed objects parsed once (unparseable -> NaT)
+#   id       : whole-number IDs / SSNs as the smallest nullable Int dtype;
+#              left as-is when a column holds anything else (e.g. '123-45-6789')
+#
+# Columns not listed (names, street lines, zip codes) keep their dtype.
+# The matching, flag and summary functions accept the compacted frames
+# as they are and give the same results as on the raw ones.
+# -------------------------------------------------------------------
+
+reoccurrence_schema = {
+    "main": {
+        "long_person_id": "id",
+        "person_id": "id",
+        "referral_id": "id",
+        "allegation_id": "id",
+        "is_index": "category",
+        "referral_sequence_type": "category",
+        "subcategory_of_abuse": "category",
+        "perp_date_of_birth": "datetime",
+        "perp_date_of_birth_estimated": "category",
+        "perp_social_security_number": "id",
+        "perp_relationship": "category",
+    },
+    "relatives": {
+        "referral_id": "id",
+        "relative_relationship": "category",
+        "relative_date_of_birth": "datetime",
+        "relative_date_of_birth_estimated": "category",
+        "relative_social_security_number": "id",
+    },
+    "address": {
+        "Referral ID": "id",
+        "Address Type": "category",
+        "City": "category",
+    },
+}
+
+
+def compact_id(s):
+    """
+    Whole numbers -> smallest nullable integer dtype (Int8 ... Int64).
+    Returns s unchanged if it holds text or fractions.
+    """
+    values = pd.to_numeric(s, errors="coerce")
+    if (values.isna() & ~blank_mask(s)).any():
+        return s
+    present = values.dropna()
+    if len(present) and not (present % 1 == 0).all():
+        return s
+    if not len(present):
+        return values.astype("Int8")
+    lo, hi = present.min(), present.max()
+    for dtype in ["Int8", "Int16", "Int32", "Int64"]:
+        info = np.iinfo(dtype.lower())
+        if info.min <= lo and hi <= info.max:
+            return values.astype(dtype)
+    return s
+
+
+def apply_reoccurrence_schema(df, table, schema=None):
+    """
+    Cast the columns of one table ('main', 'relatives' or 'address') to
+    the compact dtypes in reoccurrence_schema. Returns a new frame;
+    columns missing from df are skipped.
+    """
+    schema = (schema or reoccurrence_schema)[table]
     df = df.copy()
-    df["perp_reoccurrence_flag"] = "N"
-    df["perp_reoccurrence_match_type"] = np.nan
-    df["perp_reoccurrence_rule"] = np.nan
-    df["perp_reoccurrence_confirm_type"] = np.nan
-
-    group_cols = ["long_person_id", "person_id"]
-    needed_cols = group_cols + [
-        "is_index",
-        "referral_sequence_type",
-        "subcategory_of_abuse",
-        "referral_id",
-        "perp_first_name",
-        "perp_last_name",
-        "perp_date_of_birth",
-        "perp_date_of_birth_estimated",
-        "perp_social_security_number",
-        "perp_relationship",
-    ]
-    missing = [c for c in needed_cols if c not in df.columns]
-    if missing:
-        raise ValueError(f"df must contain columns: {missing}")
+    for col, kind in schema.items():
+        if col not in df.columns:
+            continue
+        if kind == "category":
+            df[col] = df[col].astype("category")
+        elif kind == "datetime":
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="mixed")
+        elif kind == "id":
+            df[col] = compact_id(df[col])
+        else:
+            raise ValueError(f"unknown schema kind for {col}: {kind}")
+    return df
 
-    # We will only mark the "Subsequent" rows where a CSA perp reoccurs
-    reocc_idx = set()
 
-    # per-row classification for summary
-    match_type_map = {}        # idx -> 'strong' or 'likely'
-    match_rule_map = {}        # idx -> rule number
-    confirm_type_map = {}      # idx -> 'relationship' / 'address' / None
-
-    # Work within each longitudinal person + victim person
-    for _, grp in df.groupby(group_cols):
-        idxs = list(grp.index)
-        if len(idxs) < 2:
+def frame_memory_mb(df):
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def compact_reoccurrence_frames(df=None, df_rel=None, df_add=None, schema=None):
+    """
+    Apply the schema to whichever tables are given.
+
+    Returns (frames, report):
+      - frames : {"main": df, "relatives": df_rel, "address": df_add}
+                 (only the tables given, compacted)
+      - report : DataFrame with rows / memory before and after per table
+    """
+    frames, report = {}, []
+    for table, frame in [("main", df), ("relatives", df_rel), ("address", df_add)]:
+        if frame is None:
             continue
+        compact = apply_reoccurrence_schema(frame, table, schema)
+        before, after = frame_memory_mb(frame), frame_memory_mb(compact)
+        frames[table] = compact
+        report.append({
+            "table": table,
+            "rows": len(frame),
+            "memory_before_mb": round(before, 2),
+            "memory_after_mb": round(after, 2),
+            "ratio": round(after / before, 3) if before else None,
+        })
+    return frames, pd.DataFrame(report)
+
+
+def load_reoccurrence_table(path, table, schema=None, **read_kwargs):
+    """
+    Read one table from .csv / .xlsx / .parquet and apply the schema.
+    CSV category columns are parsed straight into categories, so the
+    object version of those columns is never built. Excel workbooks go
+    through read_excel_cached (read_kwargs: sheet_name, columns,
+    cache_dir), so only the first read of a workbook version parses it.
+    """
+    schema = schema or reoccurrence_schema
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".csv":
+        category_cols = [c for c, kind in schema[table].items() if kind == "category"]
+        read_kwargs.setdefault("dtype", {c: "category" for c in category_cols})
+        df = pd.read_csv(path, **read_kwargs)
+    elif ext in (".xlsx", ".xls"):
+        df = read_excel_cached(path, **read_kwargs)
+    elif ext == ".parquet":
+        df = pd.read_parquet(path, **read_kwargs)
+    else:
+        raise ValueError(f"unsupported file type: {path}")
+    return apply_reoccurrence_schema(df, table, schema)
+
+
+# -------------------------------------------------------------------
+# Incremental mode: persisted index-CSA / Subsequent state (SQLite)
+#
+# Only rows that can take part in a pair (index-CSA or Subsequent, with
+# both group keys) are kept, in arrival order (seq). A Subsequent row's
+# result depends only on the index-CSA rows of its own group, so a run
+# only has to re-match:
+#   - the new Subsequent rows, and
+#   - older Subsequent rows of groups that received a new index-CSA row.
+# -------------------------------------------------------------------
 
-        for i in range(len(idxs)):
-            for j in range(i + 1, len(idxs)):
-                idx_i = idxs[i]
-                idx_j = idxs[j]
+def reoccurrence_state_frame(df, key_col=None):
+    """
+    The rows of df that can take part in a pair, as stored in the state
+    store: row_key + reoccurrence_needed_cols. Row keys come from key_col,
+    or from df.index when key_col is None, and must be unique and stable
+    across runs.
+
+    Values are stored unchanged (the store's columns have no type
+    affinity), so stored rows compare exactly as they would in a full run;
+    only datetimes come back as their ISO text, which keeps equality.
+    """
+    keys = df.index.to_numpy() if key_col is None else df[key_col].to_numpy()
+    is_index_csa, is_subseq = index_csa_subsequent_masks(df)
+    has_group = df[reoccurrence_group_cols].notna().all(axis=1).to_numpy()
+    keep = np.flatnonzero((is_index_csa | is_subseq) & has_group)
 
-                row_i = df.loc[idx_i]
-                row_j = df.loc[idx_j]
+    state = df[reoccurrence_needed_cols].iloc[keep].reset_index(drop=True)
+    state.insert(0, "row_key", keys[keep])
 
-                # Must be different referrals (referral-level, not row-level)
-                if row_i["referral_id"] == row_j["referral_id"]:
-                    continue
+    for c in reoccurrence_needed_cols:
+        if isinstance(state[c].dtype, pd.CategoricalDtype):
+            state[c] = state[c].astype(object)
+        if state[c].dtype == object:
+            # sqlite3 cannot bind Timestamps held in object columns
+            state[c] = state[c].map(lambda v: str(v) if isinstance(v, datetime.datetime) else v)
+    return state
 
-                # Identify index-CSA vs Subsequent
-                is_index_csa_i = (
-                    row_i["is_index"] == "Y"
-                    and row_i["subcategory_of_abuse"] == "Child Sexually Acting Out"
-                )
-                is_index_csa_j = (
-                    row_j["is_index"] == "Y"
-                    and row_j["subcategory_of_abuse"] == "Child Sexually Acting Out"
-                )
 
-                is_subseq_i = row_i["referral_sequence_type"] == "Subsequent"
-                is_subseq_j = row_j["referral_sequence_type"] == "Subsequent"
-
-                # Only keep pairs where one side is index-CSA and the other is Subsequent
-                if not (
-                    (is_index_csa_i and is_subseq_j)
-                    or (is_index_csa_j and is_subseq_i)
-                ):
-                    continue
-
-                # Build perpetrator tuples
-                r1 = (
-                    row_i["perp_first_name"],
-                    row_i["perp_last_name"],
-                    row_i["perp_date_of_birth"],
-                    row_i["perp_social_security_number"],
-                    row_i["perp_date_of_birth_estimated"],
-                )
-                r2 = (
-                    row_j["perp_first_name"],
-                    row_j["perp_last_name"],
-                    row_j["perp_date_of_birth"],
-                    row_j["perp_social_security_number"],
-                    row_j["perp_date_of_birth_estimated"],
-                )
+class ReoccurrenceStateStore:
+    """
+    Local SQLite store for incremental add_perp_reoccurrence_flag runs.
+
+    Tables:
+      - reoccurrence_rows    : row_key, seq + reoccurrence_needed_cols
+      - reoccurrence_outputs : row_key + perp_reoccurrence_* for stored
+                               Subsequent rows
+    Use path=":memory:" for a throwaway store.
+    """
+
+    rows_table = "reoccurrence_rows"
+    outputs_table = "reoccurrence_outputs"
 
-                # Decide which index is the "later" (Subsequent) row
-                if is_index_csa_i and is_subseq_j:
-                    later_idx = idx_j
-                    row_later = row_j
-                    row_index = row_i
-                    r_later, r_index = r2, r1
-                elif is_index_csa_j and is_subseq_i:
-                    later_idx = idx_i
-                    row_later = row_i
-                    row_index = row_j
-                    r_later, r_index = r1, r2
-                else:
-                    continue
-
-                # Step 1: strong match?
-                rule = match_rule(r_index, r_later)
-                matched = False
-                mtype = None
-                confirm_type = None
-                used_rule = None
-
-                if rule is not None:
-                    matched = True
-                    mtype = "strong"
-                    used_rule = rule
-                else:
-                    # Step 2: likely match + extra checks
-                    lk_rule = likely_match_rule(r_index, r_later)
-                    if lk_rule is not None:
-                        confirmed, confirm_type = confirm_likely_match(
-                            row_index, row_later, lk_rule, df_rel, df_add
-                        )
-                        if confirmed:
-                            matched = True
-                            mtype = "likely"
-                            used_rule = lk_rule
-
-                if matched:
-                    reocc_idx.add(later_idx)
-
-                    # update classification for this later row
-                    prev_type = match_type_map.get(later_idx)
-                    prev_rule = match_rule_map.get(later_idx)
-                    prev_confirm = confirm_type_map.get(later_idx)
-
-                    if prev_type is None:
-                        match_type_map[later_idx] = mtype
-                        match_rule_map[later_idx] = used_rule
-                        confirm_type_map[later_idx] = confirm_type
-                    else:
-                        # upgrade from likely -> strong if needed
-                        if prev_type == "likely" and mtype == "strong":
-                            match_type_map[later_idx] = mtype
-                            match_rule_map[later_idx] = used_rule
-                            confirm_type_map[later_idx] = confirm_type
-                        elif prev_type == mtype:
-                            # same type: keep existing rule but prefer relationship confirmation
-                            if prev_confirm != "relationship" and confirm_type == "relationship":
-                                confirm_type_map[later_idx] = "relationship"
-                            elif prev_confirm is None and confirm_type == "address":
-                                confirm_type_map[later_idx] = "address"
-                        # if prev_type is strong and new is likely, ignore new one
-
-    if reocc_idx:
-        df.loc[list(reocc_idx), "perp_reoccurrence_flag"] = "Y"
-
-        # write classification columns back to df
-        for idx, v in match_type_map.items():
-            df.at[idx, "perp_reoccurrence_match_type"] = v
-        for idx, v in match_rule_map.items():
-            df.at[idx, "perp_reoccurrence_rule"] = v
-        for idx, v in confirm_type_map.items():
-            if v is not None:
-                df.at[idx, "perp_reoccurrence_confirm_type"] = v
+    def __init__(self, path):
+        self.path = path
+        self.conn = sqlite3.connect(path)
 
+    def close(self):
+        self.conn.close()
+
+    def has_table(self, name):
+        cur = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        )
+        return cur.fetchone() is not None
+
+    def write_temp(self, name, frame):
+        frame.to_sql(name, self.conn, if_exists="replace", index=False)
+
+    def next_seq(self):
+        if not self.has_table(self.rows_table):
+            return 0
+        cur = self.conn.execute(f"SELECT MAX(seq) FROM {self.rows_table}")
+        max_seq = cur.fetchone()[0]
+        return 0 if max_seq is None else max_seq + 1
+
+    def known_keys(self, row_keys):
+        """The subset of row_keys already in the store."""
+        if not self.has_table(self.rows_table) or len(row_keys) == 0:
+            return set()
+        self.write_temp("tmp_row_keys", pd.DataFrame({"row_key": row_keys}))
+        found = pd.read_sql_query(
+            f"SELECT r.row_key FROM {self.rows_table} r "
+            f"JOIN tmp_row_keys k ON r.row_key = k.row_key",
+            self.conn,
+        )
+        return set(found["row_key"])
+
+    def append_rows(self, state):
+        # BLOB affinity: SQLite keeps ints, floats and text as given instead
+        # of converting '0123' to 123 (or 123 to '123') on insert
+        untyped = {c: "BLOB" for c in reoccurrence_needed_cols}
+        state.to_sql(self.rows_table, self.conn, if_exists="append", index=False, dtype=untyped)
+
+    def rows_for_groups(self, groups):
+        """All stored rows of the given (long_person_id, person_id) groups, in seq order."""
+        self.write_temp("tmp_groups", groups[reoccurrence_group_cols].drop_duplicates())
+        return pd.read_sql_query(
+            f"SELECT r.* FROM {self.rows_table} r "
+            f"JOIN tmp_groups g ON r.long_person_id = g.long_person_id "
+            f"AND r.person_id = g.person_id "
+            f"ORDER BY r.seq",
+            self.conn,
+        )
+
+    def write_outputs(self, outputs):
+        """Insert or replace perp_reoccurrence_* rows keyed by row_key."""
+        if self.has_table(self.outputs_table):
+            self.write_temp("tmp_row_keys", outputs[["row_key"]])
+            self.conn.execute(
+                f"DELETE FROM {self.outputs_table} "
+                f"WHERE row_key IN (SELECT row_key FROM tmp_row_keys)"
+            )
+        outputs.to_sql(self.outputs_table, self.conn, if_exists="append", index=False)
+        self.conn.commit()
+
+    def outputs(self):
+        """Current perp_reoccurrence_* columns of every stored Subsequent row, indexed by row_key."""
+        if not self.has_table(self.outputs_table):
+            return pd.DataFrame(columns=reoccurrence_output_cols).rename_axis("row_key")
+        return pd.read_sql_query(
+            f"SELECT * FROM {self.outputs_table}", self.conn, index_col="row_key"
+        )
+
+
+def add_perp_reoccurrence_flag_incremental(df_new, store, df_rel=None, df_add=None, key_col=None):
+    """
+    Incremental add_perp_reoccurrence_flag.
+
+    df_new holds only the rows that arrived since the last run (rows whose
+    key is already in the store are ignored). They are matched against the
+    index-CSA rows kept in `store` (a ReoccurrenceStateStore); older
+    Subsequent rows are re-matched only when their group received a new
+    index-CSA row, and their stored columns are updated (see
+    store.outputs()).
+
+    Returns df_new with the perp_reoccurrence_* columns, the same as a full
+    add_perp_reoccurrence_flag over all batches concatenated in arrival
+    order, provided df_rel / df_add still cover the older referrals.
+    Use verify_incremental_reoccurrence to check that against a full run.
+    """
+    missing = [c for c in reoccurrence_needed_cols if c not in df_new.columns]
+    if missing:
+        raise ValueError(f"df must contain columns: {missing}")
+
+    new_state = reoccurrence_state_frame(df_new, key_col)
+    known = store.known_keys(new_state["row_key"].to_numpy())
+    new_state = new_state[~new_state["row_key"].isin(known)].reset_index(drop=True)
+
+    if not new_state.empty:
+        new_state.insert(1, "seq", store.next_seq() + np.arange(len(new_state)))
+        store.append_rows(new_state)
+
+        group_rows = store.rows_for_groups(new_state)
+        is_index_csa, is_subseq = index_csa_subsequent_masks(group_rows)
+
+        # Old Subsequent-only rows only change if their group got a new index-CSA row
+        new_index_csa = new_state[index_csa_subsequent_masks(new_state)[0]]
+        in_new_index_group = (
+            pd.MultiIndex.from_frame(group_rows[reoccurrence_group_cols])
+            .isin(pd.MultiIndex.from_frame(new_index_csa[reoccurrence_group_cols]))
+        )
+        is_new = group_rows["row_key"].isin(new_state["row_key"]).to_numpy()
+        frame = group_rows[is_index_csa | is_new | in_new_index_group].reset_index(drop=True)
+
+        out = perp_reoccurrence_columns(frame, df_rel, df_add)
+        is_later = index_csa_subsequent_masks(frame)[1]
+        outputs = out[is_later].copy()
+        outputs.insert(0, "row_key", frame.loc[is_later, "row_key"].to_numpy())
+        store.write_outputs(outputs)
+
+    # Attach the (stored) results to df_new
+    keys = df_new.index if key_col is None else df_new[key_col]
+    stored = store.outputs()
+    df = df_new.copy()
+    defaults = empty_reoccurrence_columns(df.index)
+    for c in reoccurrence_output_cols:
+        values = pd.Series(keys.to_numpy(), index=df.index).map(stored[c])
+        df[c] = values.where(values.notna(), defaults[c])
+    df["perp_reoccurrence_rule"] = df["perp_reoccurrence_rule"].astype(float)
     return df
 
 
+def verify_incremental_reoccurrence(df_full, store, df_rel=None, df_add=None, key_col=None):
+    """
+    Verification mode for the incremental store: run the full
+    add_perp_reoccurrence_flag matching over df_full (all batches in
+    arrival order) and compare it with the stored state.
+
+    Returns the rows whose perp_reoccurrence_* columns differ, with
+    'full_*' and 'stored_*' columns; empty means identical.
+    """
+    keys = df_full.index.to_numpy() if key_col is None else df_full[key_col].to_numpy()
+    full = perp_reoccurrence_columns(df_full, df_rel, df_add).set_axis(keys)
+
+    stored = store.outputs().reindex(keys)
+    defaults = empty_reoccurrence_columns(full.index)
+    stored = stored.where(stored.notna(), defaults)
+
+    differs = np.zeros(len(full), dtype=bool)
+    for c in reoccurrence_output_cols:
+        a, b = full[c], stored[c]
+        differs |= ~((a == b) | (a.isna() & b.isna())).to_numpy()
+
+    report = pd.concat(
+        [full[differs].add_prefix("full_"), stored[differs].add_prefix("stored_")],
+        axis=1,
+    )
+    return report.rename_axis("row_key")
+
+
+# -------------------------------------------------------------------
+# Population-wide perpetrator linkage (across children) with blocking
+#
+# Instead of comparing every perpetrator record with every other one,
+# records are only compared when they share a blocking key. The keys are
+# chosen so that every strong / likely rule is covered:
+#   - ssn            : rules 0-8 and 12 (all need SSN=)
+#   - ln_dob         : rule 9  (LN= DOB=, SSN blank)
+#   - fn_soundex_dob : rule 10 (FN= DOB=, SSN blank)
+#   - fn_ln          : rule 11 (FN= LN=, SSN blank)
+# -------------------------------------------------------------------
+
+soundex_codes = {
+    **dict.fromkeys("BFPV", "1"),
+    **dict.fromkeys("CGJKQSXZ", "2"),
+    **dict.fromkeys("DT", "3"),
+    "L": "4",
+    **dict.fromkeys("MN", "5"),
+    "R": "6",
+}
+
+
+def soundex(name):
+    """American Soundex code of a name ('Robert' -> 'R163'); '' for blank."""
+    if is_blank(name):
+        return ""
+    letters = [c for c in str(name).upper() if "A" <= c <= "Z"]
+    if not letters:
+        return ""
+
+    code = letters[0]
+    prev = soundex_codes.get(letters[0], "")
+    for c in letters[1:]:
+        digit = soundex_codes.get(c, "")
+        if digit and digit != prev:
+            code += digit
+            if len(code) == 4:
+                break
+        # H and W do not separate letters with the same code, vowels do
+        if c not in "HW":
+            prev = digit
+    return code.ljust(4, "0")
+
+
+def name_key(s):
+    """Upper-cased, trimmed name text; NaN when blank."""
+    s = pd.Series(np.asarray(s, dtype=object))
+    key = s.where(s.notna(), "").astype(str).str.upper().str.strip()
+    return key.where(key != "", np.nan)
+
+
+def perp_blocking_keys(df, codes=None):
+    """
+    Blocking keys per perpetrator record (row of df), built from the same
+    fields match_rule uses. A key is NaN when any of its parts is blank.
+
+    The DOB part is the encode_identity_fields DOB code (pass codes, the
+    "main" code dict, to reuse an encoding), so two DOBs share a block
+    exactly when the rules count them as equal, whatever their format.
+
+    Returns a DataFrame with columns ssn, ln_dob, fn_soundex_dob, fn_ln.
+    """
+    if codes is None:
+        codes = encode_identity_fields(df)["main"]
+    ssn = name_key(df["perp_social_security_number"]).str.replace(r"\.0$", "", regex=True)
+
+    dob = pd.Series(codes["dob"].astype(str), dtype=object).where(codes["dob"] >= 0)
+
+    fn = name_key(df["perp_first_name"])
+    ln = name_key(df["perp_last_name"])
+    fn_sdx = fn.map(soundex, na_action="ignore")
+
+    keys = pd.DataFrame({
+        "ssn": ssn.to_numpy(),
+        "ln_dob": (ln + "|" + dob).to_numpy(),
+        "fn_soundex_dob": (fn_sdx + "|" + dob).to_numpy(),
+        "fn_ln": (fn + "|" + ln).to_numpy(),
+    }, index=df.index)
+    return keys
+
+
+def block_pairs(keys, max_block_size=None):
+    """
+    All (left_pos, right_pos) record pairs, left_pos < right_pos, that
+    share a non-blank value of one blocking key.
+
+    Blocks larger than max_block_size (e.g. a placeholder SSN) are skipped.
+    Returns (pairs DataFrame, block stats dict).
+    """
+    k = pd.DataFrame({"key": np.asarray(keys, dtype=object), "pos": np.arange(len(keys))})
+    k = k[k["key"].notna()]
+
+    sizes = k.groupby("key")["pos"].transform("size")
+    skipped = k[sizes > max_block_size] if max_block_size else k.iloc[:0]
+    k = k[(sizes > 1) & ~k.index.isin(skipped.index)]
+
+    pairs = k.merge(k, on="key", suffixes=("_left", "_right"))
+    pairs = pairs.loc[
+        pairs["pos_left"] < pairs["pos_right"], ["pos_left", "pos_right"]
+    ].rename(columns={"pos_left": "left_pos", "pos_right": "right_pos"})
+
+    stats = {
+        "blocks": k["key"].nunique(),
+        "largest_block": int(sizes.max()) if len(sizes) else 0,
+        "skipped_blocks": skipped["key"].nunique(),
+        "skipped_records": len(skipped),
+    }
+    return pairs.reset_index(drop=True), stats
+
+
+def link_perpetrators(df, blocking_keys=None, max_block_size=None):
+    """
+    Link the same perpetrator across different children / referrals.
+
+    Each row of df is one perpetrator record (perp_first_name,
+    perp_last_name, perp_date_of_birth, perp_social_security_number,
+    perp_date_of_birth_estimated). Records are compared only within
+    blocks of perp_blocking_keys and every candidate pair is classified
+    with match_rule_batch / likely_match_rule_batch. Likely matches are
+    not confirmed here (no relatives / address check).
+
+    blocking_keys: subset of the perp_blocking_keys columns to use
+                   (default: all, which covers every rule 0-12).
+
+    Returns a dict of DataFrames:
+      - "pairs"    : left_index, right_index, match_type ('strong' / 'likely'), rule
+      - "blocking" : per blocking key, how many candidate pairs it produced,
+                     how many were new vs. the keys before it, and the
+                     reduction vs. comparing all n*(n-1)/2 record pairs
+    """
+    codes = encode_identity_fields(df)["main"]
+    keys = perp_blocking_keys(df, codes)
+    if blocking_keys is not None:
+        keys = keys[list(blocking_keys)]
+
+    n = len(df)
+    all_pairs = n * (n - 1) // 2
+
+    report = []
+    candidates = []
+    seen = pd.DataFrame(columns=["left_pos", "right_pos"], dtype=np.int64)
+    for key in keys.columns:
+        pairs, stats = block_pairs(keys[key], max_block_size)
+        new = (
+            pairs.merge(seen, how="left", indicator=True)
+                 .query("_merge == 'left_only'")
+                 .drop(columns="_merge")
+        )
+        seen = pd.concat([seen, new], ignore_index=True)
+        candidates.append(new)
+        report.append({
+            "blocking_key": key,
+            **stats,
+            "candidate_pairs": len(pairs),
+            "new_pairs": len(new),
+            "reduction": 1 - len(pairs) / all_pairs if all_pairs else 0.0,
+        })
+
+    report.append({
+        "blocking_key": "all",
+        "candidate_pairs": len(seen),
+        "new_pairs": len(seen),
+        "reduction": 1 - len(seen) / all_pairs if all_pairs else 0.0,
+    })
+    blocking = pd.DataFrame(report)
+
+    left_pos = seen["left_pos"].to_numpy(dtype=np.int64)
+    right_pos = seen["right_pos"].to_numpy(dtype=np.int64)
+
+    states = code_pair_states(take_codes(codes, left_pos), take_codes(codes, right_pos))
+    strong = strong_rule_table[states]
+    likely = likely_rule_table[states]
+
+    rule = np.where(strong >= 0, strong, likely)
+    hit = rule >= 0
+    pairs = pd.DataFrame({
+        "left_index": df.index.to_numpy()[left_pos[hit]],
+        "right_index": df.index.to_numpy()[right_pos[hit]],
+        "match_type": np.where(strong[hit] >= 0, "strong", "likely"),
+        "rule": rule[hit].astype(int),
+    })
+    pairs = pairs.sort_values(["left_index", "right_index"], kind="mergesort").reset_index(drop=True)
+
+    return {"pairs": pairs, "blocking": blocking}
+
+
+# -------------------------------------------------------------------
+# EXTRA: derived flags for summaries
+#   - perp_in_child_family (Y/N, based on relationship)
+#   - address_exact_match_flag (Y/N, based on primary address)
+# -------------------------------------------------------------------
+
+address_columns = ["Referral ID", "Address Line 1", "City", "Zip Code", "address_key"]
+
+annotation_needed_cols = reoccurrence_group_cols + ["referral_id", "perp_relationship"]
+
+
+def family_and_address_columns(df, df_add, include_address=True):
+    """
+    Copy-free form of add_perp_in_family_and_address_flags: returns only
+    the new columns, aligned on df.index, reading just the columns it
+    needs from df:
+
+      - perp_in_child_family     (Y/N)
+      - Referral ID, Address Line 1, City, Zip Code, address_key
+        (the referral's primary address; left out with include_address=False)
+      - address_exact_match_flag (Y/N)
+
+    Addresses are looked up by position in the AddressIndex table instead
+    of merging them into the whole frame.
+    """
+    if not isinstance(df_add, AddressIndex):
+        df_add = AddressIndex(df_add)
+
+    out = pd.DataFrame(index=df.index)
+
+    # 1) Perp in child's family? (Father/Mother/Guardian/Sibling bucket)
+    out["perp_in_child_family"] = np.where(
+        df["perp_relationship"].isin(allowed_relationships), "Y", "N"
+    )
+
+    # 2) Primary address of each row's referral (-1 -> no primary address)
+    table = df_add.table
+    pos = pd.Index(table["Referral ID"]).get_indexer(df["referral_id"])
+    address_key = table["address_key"].reindex(pos).to_numpy()
+    if include_address:
+        for c in address_columns:
+            out[c] = table[c].reindex(pos).to_numpy()
+
+    # Within same child (long_person_id, person_id) and same address, if there is more
+    # than one distinct referral_id => address exact match reoccurrence.
+    mask = pd.notna(address_key) & (address_key != "")
+    keys = pd.DataFrame({
+        "long_person_id": df["long_person_id"].to_numpy()[mask],
+        "person_id": df["person_id"].to_numpy()[mask],
+        "address_key": address_key[mask],
+        "referral_id": df["referral_id"].to_numpy()[mask],
+    })
+    counts = (
+        keys.groupby(["long_person_id", "person_id", "address_key"])["referral_id"]
+            .transform("nunique")
+            .to_numpy()
+    )
+    flag = np.full(len(df), "N", dtype=object)
+    flag[np.flatnonzero(mask)[counts > 1]] = "Y"
+    out["address_exact_match_flag"] = flag
+
+    return out
+
+
+def add_perp_in_family_and_address_flags(df_with_flag, df_add):
+    """
+    df_add can be the address table or the AddressIndex already used for
+    add_perp_reoccurrence_flag, so both steps agree on what counts as
+    the same address.
+
+    Returns a copy of df_with_flag (fresh 0..n-1 index) with the columns
+    of family_and_address_columns added.
+    """
+    new_cols = family_and_address_columns(df_with_flag, df_add)
+    return with_columns(df_with_flag, new_cols).reset_index(drop=True)
+
+
+def perp_pipeline_columns(df, df_rel=None, df_add=None, n_jobs=1, stats=None,
+                          include_address=False):
+    """
+    Flag + annotate in pipeline mode: df is never copied and only the new
+    columns come back, aligned on df.index:
+
+      perp_reoccurrence_* (add_perp_reoccurrence_flag) and, when df_add
+      is given, perp_in_child_family / address_exact_match_flag
+      (+ the address columns with include_address=True).
+
+    The address table is indexed once for both steps. Summaries read the
+    result without a combined frame:
+
+        cols = perp_pipeline_columns(df, df_rel, df_add)
+        summarize_perp_reoccurrence(df, new_cols=cols)
+        build_grain_summaries(df, new_cols=cols)
+
+    and with_columns(df, cols) materializes one only if it is needed.
+    """
+    if df_add is not None and not isinstance(df_add, AddressIndex):
+        df_add = AddressIndex(df_add)
+
+    new_cols = reoccurrence_flag_columns(df, df_rel, df_add, n_jobs, stats)
+    if df_add is not None:
+        annotation = family_and_address_columns(df, df_add, include_address)
+        for c in annotation.columns:
+            new_cols[c] = annotation[c].to_numpy()
+    return new_cols
+
+
+def pipeline_projection(df, new_cols, columns):
+    """
+    The listed columns as one small frame, each taken from new_cols if it
+    has it and from df otherwise (df itself is not copied).
+    """
+    if new_cols is None:
+        return df
+    return pd.DataFrame(
+        {c: (new_cols[c] if c in new_cols.columns else df[c]).to_numpy() for c in columns},
+        index=df.index,
+    )
+
+
+# -------------------------------------------------------------------
+# SUMMARIES at several grains (single-pass rollup)
+#   lvl1 = (referral_id, person_id, allegation_id)
+#   lvl2 = (referral_id, person_id)
+#
+# For each grain:
+#   1. Perp in child's family: Y / N counts
+#   2. Out of Y: reoccurrence_flag Y / N counts
+#   3. Out of N: address_exact_match_flag Y / N and final match Y / N
+# -------------------------------------------------------------------
+
+grain_flag_cols = [
+    "perp_in_child_family",
+    "perp_reoccurrence_flag",
+    "address_exact_match_flag",
+]
+
+summary_grains = {
+    "lvl1": ["referral_id", "person_id", "allegation_id"],
+    "lvl2": ["referral_id", "person_id"],
+}
+
+
+def rollup_flags(df, grains, flag_cols=grain_flag_cols):
+    """
+    'Any row is Y' rollup of Y/N flag columns to several grains at once.
+
+    grains is {name: key columns}. The flags are turned into booleans once
+    and max-aggregated to the base grain (the union of all key columns);
+    every requested grain is then aggregated from that base table instead
+    of from df. The base grain keeps blank keys, each grain drops rows with
+    a blank key of its own, the same as a direct groupby would.
+
+    Returns {name: DataFrame of key columns + boolean flag columns},
+    sorted by the keys.
+    """
+    base_keys = []
+    for keys in grains.values():
+        base_keys += [k for k in keys if k not in base_keys]
+
+    flags = pd.DataFrame({c: df[c].eq("Y").to_numpy() for c in flag_cols})
+    for k in base_keys:
+        flags[k] = df[k].to_numpy()
+
+    base = flags.groupby(base_keys, sort=False, dropna=False)[flag_cols].max().reset_index()
+
+    tables = {}
+    for name, keys in grains.items():
+        if list(keys) == base_keys:
+            table = base.dropna(subset=base_keys).sort_values(base_keys, kind="mergesort")
+        else:
+            table = base.groupby(list(keys))[flag_cols].max().reset_index()
+        tables[name] = table.reset_index(drop=True)
+    return tables
+
+
+def yn_counts(values, col):
+    """value_counts of a boolean array as a Y / N table (col, count)."""
+    n_yes = int(values.sum())
+    n_no = len(values) - n_yes
+    counts = [
+        ("Y", n_yes, values.argmax() if n_yes else 0),
+        ("N", n_no, (~values).argmax() if n_no else 0),
+    ]
+    # most frequent first, ties in order of first appearance (like value_counts)
+    counts = sorted((c for c in counts if c[1] > 0), key=lambda c: (-c[1], c[2]))
+    return pd.DataFrame({
+        col: pd.Series([c[0] for c in counts], dtype=object),
+        "count": pd.Series([c[1] for c in counts], dtype="int64"),
+    })
+
+
+def grain_counts(table):
+    """The four Y / N count tables of one rolled-up grain."""
+    family = table["perp_in_child_family"].to_numpy()
+    reoccurrence = table["perp_reoccurrence_flag"].to_numpy()
+    address = table["address_exact_match_flag"].to_numpy()
+    return {
+        "family_counts": yn_counts(family, "perp_in_child_family"),
+        "family_yes_match_counts": yn_counts(reoccurrence[family], "perp_reoccurrence_flag"),
+        "nonfam_addr_counts": yn_counts(address[~family], "address_exact_match_flag"),
+        "nonfam_final_match_counts": yn_counts(reoccurrence[~family], "perp_reoccurrence_flag"),
+    }
+
+
+def build_grain_summaries(df_annot, extra_grains=None, new_cols=None):
+    """
+    Y / N breakdowns of a frame from add_perp_in_family_and_address_flags
+    at the lvl1 and lvl2 grains (see summary_grains).
+
+    extra_grains adds more grains in the same pass, e.g.
+    {"child": ["long_person_id"]}; each comes back under its own prefix
+    ("child_table", "child_family_counts", ...).
+
+    new_cols: the result of perp_pipeline_columns; flags are then read
+    from it and keys from df_annot, without a combined frame.
+
+    Returns {"<grain>_table": Y/N flags per key,
+             "<grain>_family_counts", "<grain>_family_yes_match_counts",
+             "<grain>_nonfam_addr_counts", "<grain>_nonfam_final_match_counts"}.
+    """
+    grains = dict(summary_grains)
+    grains.update(extra_grains or {})
+
+    keys = []
+    for grain_keys in grains.values():
+        keys += [k for k in grain_keys if k not in keys]
+    df_annot = pipeline_projection(df_annot, new_cols, keys + grain_flag_cols)
+
+    summaries = {}
+    for name, table in rollup_flags(df_annot, grains).items():
+        counts = grain_counts(table)
+        for c in grain_flag_cols:
+            table[c] = np.where(table[c], "Y", "N")
+        summaries[f"{name}_table"] = table
+        for key, value in counts.items():
+            summaries[f"{name}_{key}"] = value
+    return summaries
+
+
 # -------------------------------------------------------------------
 # Summary helper
 # -------------------------------------------------------------------
 
-def summarize_perp_reoccurrence(df):
+summary_needed_cols = reoccurrence_output_cols + ["perp_relationship"]
+
+
+def summarize_perp_reoccurrence(df, new_cols=None):
     """
     Given a dataframe returned by add_perp_reoccurrence_flag,
     produce breakdowns:
@@ -462,11 +2044,17 @@ def summarize_perp_reoccurrence(df):
         * how many were NOT in child's family but had same address (Y/N)
 
     Returns a dict of summary DataFrames.
+
+    new_cols: the result of reoccurrence_flag_columns / perp_pipeline_columns;
+    the perp_reoccurrence_* columns are then read from it and
+    perp_relationship from df. Only flagged rows of the needed columns
+    are copied.
     """
-    df = df.copy()
+    df = pipeline_projection(df, new_cols, summary_needed_cols)
     family_set = set(allowed_relationships)
 
-    flagged = df[df["perp_reoccurrence_flag"] == "Y"].copy()
+    is_flagged = (df["perp_reoccurrence_flag"] == "Y").to_numpy()
+    flagged = df.loc[is_flagged, summary_needed_cols].copy()
     if flagged.empty:
         return {
             "by_match_type": pd.DataFrame(columns=["match_type", "count"]),
@@ -542,8 +2130,238 @@ def summarize_perp_reoccurrence(df):
         "likely_nonfamily_same_address": s_likely_nonfam_address,
     }
 
-df_with_flags = add_perp_reoccurrence_flag(df, df_rel, df_add)
-summaries = summarize_perp_reoccurrence(df_with_flags)
 
-summaries["by_match_type"]
-summaries["likely_by_family"]
+# -------------------------------------------------------------------
+# Memoized pipeline: flag -> annotate -> summaries, cached per stage
+#
+#   flag     : reoccurrence_flag_columns    <- df (matching cols), df_rel, df_add
+#   annotate : family_and_address_columns   <- df (annotation cols), df_add
+#   summary  : summarize_perp_reoccurrence  <- flag, df (perp_relationship)
+#   grains   : build_grain_summaries        <- flag, annotate, df (grain keys), extra_grains
+#
+# Each stage's key hashes only the input columns it reads, its parameters
+# and the results of the stages it depends on. Results are stored as
+# Parquet under cache_dir, so a rerun with an unchanged key loads from
+# disk and a change (say, to df_add or extra_grains) recomputes only the
+# stages downstream of it -- and stops early when an upstream result
+# comes out the same.
+# -------------------------------------------------------------------
+
+pipeline_cache_version = 1
+
+
+def frame_fingerprint(df, columns=None):
+    """
+    Content hash (hex) of df, or of the listed columns only: names, dtypes,
+    index and values. None -> "none".
+    """
+    if df is None:
+        return "none"
+    columns = list(df.columns if columns is None else columns)
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(c) for c in columns]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df.index).to_numpy().tobytes())
+    for c in columns:
+        col = df[c]
+        digest.update(str(col.dtype).encode("utf-8"))
+        try:
+            hashed = pd.util.hash_pandas_object(col, index=False)
+        except TypeError:
+            # mixed-type object column
+            hashed = pd.util.hash_pandas_object(col.astype(str), index=False)
+        digest.update(hashed.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def write_parquet_result(result, path):
+    """A DataFrame -> path.parquet, a dict of DataFrames -> path/ (atomic)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    if isinstance(result, dict):
+        os.makedirs(tmp)
+        for i, (name, frame) in enumerate(result.items()):
+            frame.to_parquet(os.path.join(tmp, f"{i}.parquet"))
+        with open(os.path.join(tmp, "keys.json"), "w") as f:
+            json.dump(list(result), f)
+        os.replace(tmp, path)
+    else:
+        result.to_parquet(tmp)
+        os.replace(tmp, path + ".parquet")
+
+
+def read_parquet_result(path):
+    """Inverse of write_parquet_result, or None if nothing is cached."""
+    def load(file):
+        frame = pd.read_parquet(file)
+        # Parquet brings text nulls back as None; the stages produce NaN
+        for c in frame.columns[frame.dtypes == object]:
+            frame[c] = frame[c].where(frame[c].notna(), np.nan)
+        return frame
+
+    if os.path.exists(path + ".parquet"):
+        return load(path + ".parquet")
+    if os.path.isdir(path):
+        with open(os.path.join(path, "keys.json")) as f:
+            names = json.load(f)
+        return {name: load(os.path.join(path, f"{i}.parquet")) for i, name in enumerate(names)}
+    return None
+
+
+class ReoccurrencePipeline:
+    """
+    Notebook runner for flag -> annotate -> summaries with on-disk
+    memoization per stage:
+
+        pipe = ReoccurrencePipeline(".pipeline_cache")
+        out = pipe.run(df, df_rel, df_add)
+        out["summary"]["by_match_type"], out["grains"]["lvl1_family_counts"]
+        pipe.last_run    # {"flag": "cached", "annotate": "computed", ...}
+
+    run() returns {"flag", "annotate", "summary", "grains"}: the two
+    column frames of perp_pipeline_columns (aligned on df.index) and the
+    two summary dicts. df_rel / df_add must be the raw tables (they are
+    hashed), not prebuilt indexes.
+    """
+
+    stages = ["flag", "annotate", "summary", "grains"]
+
+    def __init__(self, cache_dir=".pipeline_cache"):
+        self.cache_dir = cache_dir
+        self.last_run = {}
+
+    def stage_key(self, stage, *parts):
+        digest = hashlib.sha256()
+        digest.update(f"{stage}:{pipeline_cache_version}".encode("utf-8"))
+        for part in parts:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()[:32]
+
+    def cached(self, stage, key, compute):
+        path = os.path.join(self.cache_dir, f"{stage}-{key}")
+        result = read_parquet_result(path)
+        if result is not None:
+            self.last_run[stage] = "cached"
+            return result
+        result = compute()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        write_parquet_result(result, path)
+        self.last_run[stage] = "computed"
+        return result
+
+    def run(self, df, df_rel=None, df_add=None, extra_grains=None, stages=None, n_jobs=1):
+        """
+        Run the requested stages (default: all) plus whatever they depend
+        on. n_jobs only changes how the flag stage runs, not its key.
+        """
+        stages = set(stages or self.stages)
+        if "grains" in stages:
+            stages |= {"flag", "annotate"}
+        if "summary" in stages:
+            stages.add("flag")
+        if df_add is None:
+            stages -= {"annotate", "grains"}
+
+        self.last_run = {}
+        address_index = []   # built at most once, only if a stage computes
+
+        def add_index():
+            if df_add is None:
+                return None
+            if not address_index:
+                address_index.append(AddressIndex(df_add))
+            return address_index[0]
+
+        rel_fp = frame_fingerprint(df_rel)
+        add_fp = frame_fingerprint(df_add)
+        out, keys = {}, {}
+
+        if "flag" in stages:
+            keys["flag"] = self.stage_key(
+                "flag", frame_fingerprint(df, reoccurrence_needed_cols), rel_fp, add_fp
+            )
+            out["flag"] = self.cached("flag", keys["flag"], lambda: reoccurrence_flag_columns(
+                df, df_rel, add_index(), n_jobs
+            ))
+
+        if "annotate" in stages:
+            keys["annotate"] = self.stage_key(
+                "annotate", frame_fingerprint(df, annotation_needed_cols), add_fp
+            )
+            out["annotate"] = self.cached("annotate", keys["annotate"], lambda: family_and_address_columns(
+                df, add_index(), include_address=False
+            ))
+
+        if "summary" in stages:
+            keys["summary"] = self.stage_key(
+                "summary", frame_fingerprint(out["flag"]), frame_fingerprint(df, ["perp_relationship"])
+            )
+            out["summary"] = self.cached("summary", keys["summary"], lambda: summarize_perp_reoccurrence(
+                df, new_cols=out["flag"]
+            ))
+
+        if "grains" in stages:
+            grains = dict(summary_grains)
+            grains.update(extra_grains or {})
+            grain_keys = []
+            for keys_of_grain in grains.values():
+                grain_keys += [k for k in keys_of_grain if k not in grain_keys]
+            keys["grains"] = self.stage_key(
+                "grains", frame_fingerprint(out["flag"]), frame_fingerprint(out["annotate"]),
+                frame_fingerprint(df, grain_keys), grains,
+            )
+            out["grains"] = self.cached("grains", keys["grains"], lambda: build_grain_summaries(
+                df, extra_grains, new_cols=pd.concat([out["flag"], out["annotate"]], axis=1)
+            ))
+
+        return out
+
+    def clear(self):
+        """Drop every cached stage result."""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+# -------------------------------------------------------------------
+# EXAMPLE USAGE
+# -------------------------------------------------------------------
+# df      = your main longitudinal-perp dataframe
+# df_rel  = relatives table
+# df_add  = address table
+
+# 1) Run the matching logic; build the address index once and share it:
+# add_index = AddressIndex(df_add)
+# df_with_flags = add_perp_reoccurrence_flag(df, df_rel, add_index)
+# summaries = summarize_perp_reoccurrence(df_with_flags)
+#
+# summaries["by_match_type"]
+# summaries["likely_by_family"]
+
+# 2) Add derived flags (same address index) & build grain summaries:
+# df_annot = add_perp_in_family_and_address_flags(df_with_flags, add_index)
+# grains = build_grain_summaries(df_annot, extra_grains={"child": ["long_person_id"]})
+# grains["lvl1_family_counts"], grains["child_nonfam_addr_counts"]
+
+# 2b) Wide frames: pipeline mode returns only the new columns, no copies:
+# cols = perp_pipeline_columns(df, df_rel, add_index)
+# summarize_perp_reoccurrence(df, new_cols=cols)
+# build_grain_summaries(df, new_cols=cols)
+# df_full = with_columns(df, cols)   # only if a combined frame is needed
+
+# 3) Compact dtypes first if memory is tight (same results):
+# frames, report = compact_reoccurrence_frames(df, df_rel, df_add)
+# df, df_rel, df_add = frames["main"], frames["relatives"], frames["address"]
+
+# 4) Notebook reruns: cache every stage on disk, recompute only what changed:
+# pipe = ReoccurrencePipeline(".pipeline_cache")
+# out = pipe.run(df, df_rel, df_add, extra_grains={"child": ["long_person_id"]})
+# pipe.last_run
+
+# 5) Where did the time go? Collect stage timings / counters:
+# stats = ReoccurrenceStats(sink=logging.getLogger(__name__))   # or a .jsonl path
+# add_perp_reoccurrence_flag(df, df_rel, add_index, stats=stats)
+# stats.as_dict()["timings"]
+
+# 6) Batches arriving over time: keep the pairing state in SQLite and match
+#    only new rows; DOBs and keys are stored as read (text DOBs included).
+#    Check the store against a full perp_reoccurrence_columns run:
+# store = ReoccurrenceStateStore("reoccurrence_state.db")
+# df_batch = add_perp_reoccurrence_flag_incremental(df_batch, store, df_rel, add_index, key_col="row_id")
+# verify_incremental_reoccurrence(df_all, store, df_rel, add_index, key_col="row_id").empty
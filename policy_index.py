@@ -0,0 +1,405 @@
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import Counter
+
+import numpy as np
+
+# -------------------------------------------------------------------
+# In-process retrieval index for the Policy Navigator
+#
+# Replaces the vector-search round trip of the RAG design (see outg) for
+# a single app instance. Chunk embeddings live in a memory-mapped float32
+# matrix (rows L2-normalized, so cosine similarity is a dot product);
+# queries are scored with batched NumPy products over row blocks, or over
+# the few IVF lists nearest the query when the corpus is large. A BM25
+# keyword index runs alongside, and search() blends both scores.
+#
+# On disk an index is a directory of immutable versions plus a CURRENT
+# file naming the live one; write_index() builds a new version next to
+# the old one and swaps CURRENT atomically, so readers never see a
+# half-written index.
+#
+#   embedder = HashingEmbedder()                  # offline stand-in
+#   write_index("policy_index", chunks, embedder.embed([c["text"] for c in chunks]),
+#               embedder_name=embedder.name)
+#   index = PolicyIndex.open("policy_index")
+#   for hit in index.search(question, k=5, embedder=embedder):
+#       ContentArea().render(hit["text"])
+# -------------------------------------------------------------------
+
+# corpora at least this large get an IVF coarse index by default
+IVF_MIN_ROWS = 50_000
+# old versions kept after a swap (readers may still have them mapped)
+KEEP_VERSIONS = 2
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the
+this to was were will with which who what when where how can may must shall
+""".split())
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:['-][a-z0-9]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lower-case word tokens without stop words."""
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+
+
+def normalize_rows(x: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length (all-zero rows stay zero), as float32."""
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    return x / np.where(norms > 0, norms, 1).astype(np.float32)
+
+
+class HashingEmbedder:
+    """
+    Offline stand-in for the embedding model: signed feature hashing of
+    words and word pairs into dim buckets, L2-normalized. Deterministic,
+    needs no network, and similar wording gives similar vectors.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+            if not features:
+                continue
+            hashes = np.array(
+                [int.from_bytes(hashlib.blake2b(f.encode("utf-8"), digest_size=8).digest(), "little")
+                 for f in features],
+                dtype=np.uint64,
+            )
+            buckets = (hashes % np.uint64(self.dim)).astype(np.int64)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(out[i], buckets, signs)
+        return normalize_rows(out)
+
+
+# -------------------------------------------------------------------
+# Dense search
+# -------------------------------------------------------------------
+
+def merge_top_k(best_ids, best_scores, ids, scores, k):
+    """Keep the k highest scores per query row out of two candidate sets."""
+    ids = np.concatenate([best_ids, ids], axis=1)
+    scores = np.concatenate([best_scores, scores], axis=1)
+    if scores.shape[1] > k:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        ids = np.take_along_axis(ids, part, axis=1)
+        scores = np.take_along_axis(scores, part, axis=1)
+    return ids, scores
+
+
+def sort_top_k(ids, scores):
+    order = np.argsort(-scores, axis=1, kind="stable")
+    return np.take_along_axis(ids, order, axis=1), np.take_along_axis(scores, order, axis=1)
+
+
+def exact_search(matrix: np.ndarray, queries: np.ndarray, k: int, block_rows: int = 65_536):
+    """
+    Exact top-k by dot product for a batch of queries (q x d) against all
+    rows, one block of rows at a time so only a block of the memory map is
+    touched at once. Returns (ids, scores), both q x k, best first.
+    """
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    k = min(k, len(matrix))
+    best_ids = np.empty((len(queries), 0), dtype=np.int64)
+    best_scores = np.empty((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start:start + block_rows])
+        scores = queries @ block.T
+        ids = np.broadcast_to(np.arange(start, start + len(block)), scores.shape)
+        best_ids, best_scores = merge_top_k(best_ids, best_scores, ids, scores, k)
+    return sort_top_k(best_ids, best_scores)
+
+
+def train_ivf(matrix: np.ndarray, n_lists: int, iters: int = 10, sample: int = 50_000,
+              block_rows: int = 65_536, seed: int = 0):
+    """
+    Spherical k-means coarse quantizer trained on a row sample, then every
+    row assigned to its nearest centroid. Returns (centroids, order,
+    offsets): the rows of list l are order[offsets[l]:offsets[l + 1]].
+    """
+    rng = np.random.default_rng(seed)
+    n = len(matrix)
+    n_lists = max(1, min(n_lists, n))
+    rows = np.sort(rng.choice(n, size=min(sample, n), replace=False))
+    train = np.asarray(matrix[rows])
+    centroids = train[rng.choice(len(train), size=n_lists, replace=False)].copy()
+    for _ in range(iters):
+        assign = (train @ centroids.T).argmax(axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, train)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        # re-seed empty lists with random training rows
+        sums[empty] = train[rng.choice(len(train), size=int(empty.sum()))]
+        centroids = normalize_rows(sums)
+
+    assign = np.empty(n, dtype=np.int64)
+    for start in range(0, n, block_rows):
+        assign[start:start + block_rows] = (np.asarray(matrix[start:start + block_rows]) @ centroids.T).argmax(axis=1)
+    order = np.argsort(assign, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))])
+    return centroids, order, offsets
+
+
+def ivf_search(matrix, centroids, order, offsets, queries, k, n_probe=8):
+    """Approximate top-k: exact scores over the rows of the n_probe nearest lists only."""
+    queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+    n_probe = min(n_probe, len(centroids))
+    nearest = np.argpartition(-(queries @ centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+    all_ids, all_scores = [], []
+    for query, lists in zip(queries, nearest):
+        # sorted ids read the memory map front to back
+        candidates = np.sort(np.concatenate([order[offsets[l]:offsets[l + 1]] for l in lists]))
+        scores = np.asarray(matrix[candidates]) @ query
+        top = min(k, len(candidates))
+        pick = np.argpartition(-scores, top - 1)[:top] if top else np.empty(0, dtype=np.int64)
+        pick = pick[np.argsort(-scores[pick], kind="stable")]
+        all_ids.append(np.pad(candidates[pick], (0, k - top), constant_values=-1))
+        all_scores.append(np.pad(scores[pick], (0, k - top), constant_values=-np.inf))
+    return np.array(all_ids), np.array(all_scores, dtype=np.float32)
+
+
+# -------------------------------------------------------------------
+# BM25 keyword index
+# -------------------------------------------------------------------
+
+class BM25Index:
+    """Okapi BM25 over chunk texts, postings stored as CSR arrays per term."""
+
+    def __init__(self, vocab: dict, indptr, doc_ids, term_freqs, doc_len, k1: float = 1.5, b: float = 0.75):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.term_freqs = term_freqs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.avg_len = float(doc_len.mean()) if len(doc_len) else 0.0
+
+    @classmethod
+    def build(cls, texts: list[str], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        vocab, postings = {}, []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_len[doc] = sum(counts.values())
+            for term, tf in counts.items():
+                postings.append((vocab.setdefault(term, len(vocab)), doc, tf))
+        postings = np.array(postings, dtype=np.int64).reshape(-1, 3)
+        postings = postings[np.argsort(postings[:, 0], kind="stable")]
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(postings[:, 0], minlength=len(vocab)))])
+        return cls(vocab, indptr, postings[:, 1], postings[:, 2].astype(np.float32), doc_len, k1, b)
+
+    def scores(self, query: str) -> np.ndarray:
+        """BM25 score of every chunk for the query."""
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        n = len(self.doc_len)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            docs = self.doc_ids[self.indptr[t]:self.indptr[t + 1]]
+            tf = self.term_freqs[self.indptr[t]:self.indptr[t + 1]]
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avg_len)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return scores
+
+    def save(self, path: str):
+        np.savez(os.path.join(path, "bm25.npz"), indptr=self.indptr, doc_ids=self.doc_ids,
+                 term_freqs=self.term_freqs, doc_len=self.doc_len, params=np.array([self.k1, self.b]))
+        with open(os.path.join(path, "vocab.json"), "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        arrays = np.load(os.path.join(path, "bm25.npz"))
+        with open(os.path.join(path, "vocab.json"), encoding="utf-8") as f:
+            vocab = json.load(f)
+        k1, b = arrays["params"]
+        return cls(vocab, arrays["indptr"], arrays["doc_ids"], arrays["term_freqs"], arrays["doc_len"], float(k1), float(b))
+
+
+# -------------------------------------------------------------------
+# Versioned storage
+# -------------------------------------------------------------------
+
+def current_version(index_dir: str) -> str | None:
+    try:
+        with open(os.path.join(index_dir, "CURRENT"), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_index(index_dir: str, chunks: list[dict], embeddings, embedder_name: str = "",
+                n_lists: int | None = None, block_rows: int = 65_536,
+                extra_meta: dict | None = None) -> str:
+    """
+    Write chunks (dicts with at least "chunk_id" and "text") and their
+    embeddings (one row per chunk, any float array or iterable of row
+    blocks) as a new index version, then make it the live one. n_lists
+    sets the IVF list count (default: sqrt(n) from IVF_MIN_ROWS rows on,
+    0 for none). extra_meta is stored in meta.json next to the built-in
+    keys. Returns the version name.
+    """
+    # names sort by creation time (prune_versions relies on it)
+    version = f"{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10**9:09d}-{uuid.uuid4().hex[:6]}"
+    versions = os.path.join(index_dir, "versions")
+    tmp = os.path.join(versions, f".tmp-{version}")
+    os.makedirs(tmp)
+
+    blocks = [embeddings] if isinstance(embeddings, np.ndarray) else embeddings
+    dim, rows = None, 0
+    with open(os.path.join(tmp, "embeddings.f32"), "wb") as f:
+        for block in blocks:
+            block = normalize_rows(np.atleast_2d(block))
+            dim = block.shape[1]
+            block.tofile(f)
+            rows += len(block)
+    if rows != len(chunks):
+        shutil.rmtree(tmp)
+        raise ValueError(f"{len(chunks)} chunks but {rows} embedding rows")
+
+    with open(os.path.join(tmp, "chunks.jsonl"), "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk, ensure_ascii=False) + "\n")
+    BM25Index.build([chunk["text"] for chunk in chunks]).save(tmp)
+
+    if n_lists is None:
+        n_lists = int(math.sqrt(rows)) if rows >= IVF_MIN_ROWS else 0
+    if n_lists and rows:
+        matrix = np.memmap(os.path.join(tmp, "embeddings.f32"), dtype=np.float32, mode="r", shape=(rows, dim))
+        centroids, order, offsets = train_ivf(matrix, n_lists, block_rows=block_rows)
+        np.savez(os.path.join(tmp, "ivf.npz"), centroids=centroids, order=order, offsets=offsets)
+        del matrix
+
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({**(extra_meta or {}), "rows": rows, "dim": dim or 0,
+                   "embedder": embedder_name, "ivf_lists": n_lists or 0}, f)
+
+    os.replace(tmp, os.path.join(versions, version))
+    pointer = os.path.join(index_dir, f"CURRENT.{os.getpid()}.tmp")
+    with open(pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(index_dir, "CURRENT"))
+    prune_versions(index_dir)
+    return version
+
+
+def prune_versions(index_dir: str, keep: int = KEEP_VERSIONS):
+    """Remove all but the newest `keep` versions (never the live one)."""
+    versions = os.path.join(index_dir, "versions")
+    live = current_version(index_dir)
+    names = sorted(n for n in os.listdir(versions) if not n.startswith("."))
+    for name in names[:-keep] if keep else names:
+        if name != live:
+            shutil.rmtree(os.path.join(versions, name), ignore_errors=True)
+
+
+# -------------------------------------------------------------------
+# Index
+# -------------------------------------------------------------------
+
+class PolicyIndex:
+    """One opened index version: memory-mapped embeddings, chunks, BM25 and optional IVF."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            self.meta = json.load(f)
+        rows, dim = self.meta["rows"], self.meta["dim"]
+        self.embeddings = (
+            np.memmap(os.path.join(path, "embeddings.f32"), dtype=np.float32, mode="r", shape=(rows, dim))
+            if rows else np.zeros((0, dim), dtype=np.float32)
+        )
+        with open(os.path.join(path, "chunks.jsonl"), encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f]
+        self.bm25 = BM25Index.load(path)
+        self.ivf = None
+        if self.meta["ivf_lists"]:
+            ivf = np.load(os.path.join(path, "ivf.npz"))
+            self.ivf = (ivf["centroids"], ivf["order"], ivf["offsets"])
+
+    @classmethod
+    def open(cls, index_dir: str) -> "PolicyIndex":
+        """The live version of the index in index_dir."""
+        version = current_version(index_dir)
+        if version is None:
+            raise FileNotFoundError(f"no index in {index_dir}")
+        return cls(os.path.join(index_dir, "versions", version))
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def dense_search(self, query_vectors, k: int = 5, n_probe: int | None = 8):
+        """
+        Top-k chunk ids and cosine scores for a batch of query vectors.
+        Uses the IVF lists when the index has them and n_probe is set,
+        exact search otherwise.
+        """
+        queries = normalize_rows(np.atleast_2d(query_vectors))
+        if self.ivf is not None and n_probe:
+            return ivf_search(self.embeddings, *self.ivf, queries, k, n_probe)
+        return exact_search(self.embeddings, queries, k)
+
+    def keyword_search(self, query: str, k: int = 5):
+        scores = self.bm25.scores(query)
+        k = min(k, len(scores))
+        ids = np.argpartition(-scores, k - 1)[:k] if k else np.empty(0, dtype=np.int64)
+        ids = ids[np.argsort(-scores[ids], kind="stable")]
+        return ids, scores[ids]
+
+    def search(self, query: str, k: int = 5, embedder=None, query_vector=None,
+               alpha: float = 0.6, candidates: int = 50, n_probe: int | None = 8) -> list[dict]:
+        """
+        Hybrid search. The dense top `candidates` and the BM25 top
+        `candidates` are pooled, both scores are min-max scaled over the
+        pool and blended as alpha * dense + (1 - alpha) * keyword. Without
+        an embedder or query_vector this is keyword search.
+        Returns chunk dicts with "score", "dense" and "keyword" added.
+        """
+        if not len(self):
+            return []
+        keyword = self.bm25.scores(query)
+        pool = set(np.argpartition(-keyword, min(candidates, len(self)) - 1)[:candidates].tolist())
+        pool = {i for i in pool if keyword[i] > 0}
+
+        if query_vector is None and embedder is not None:
+            query_vector = embedder.embed([query])[0]
+        if query_vector is not None:
+            q = normalize_rows(np.atleast_2d(query_vector))[0]
+            ids, _ = self.dense_search(q, candidates, n_probe)
+            pool.update(int(i) for i in ids[0] if i >= 0)
+        if not pool:
+            return []
+
+        pool = np.array(sorted(pool))
+        dense = np.asarray(self.embeddings[pool]) @ q if query_vector is not None else np.zeros(len(pool), np.float32)
+        kw = keyword[pool]
+        weight = alpha if query_vector is not None else 0.0
+
+        def scaled(x):
+            span = x.max() - x.min()
+            return (x - x.min()) / span if span > 0 else np.ones_like(x) * (x.max() > 0)
+
+        fused = weight * scaled(dense) + (1 - weight) * scaled(kw)
+        order = np.argsort(-fused, kind="stable")[:k]
+        return [
+            {**self.chunks[pool[i]], "score": float(fused[i]), "dense": float(dense[i]), "keyword": float(kw[i])}
+            for i in order
+        ]
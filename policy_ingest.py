@@ -0,0 +1,359 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from xml.etree import ElementTree
+
+import numpy as np
+
+from policy_index import HashingEmbedder, PolicyIndex, current_version, write_index
+
+# -------------------------------------------------------------------
+# Incremental ingestion of policy documents into the retrieval index
+#
+#   python policy_ingest.py policy_docs/ policy_index/ --workers 4
+#
+# The live index carries the manifest: meta.json records every document's
+# size, mtime and sha256 (also documents that produced no chunks), and every
+# chunk its own text hash. A refresh
+#   1. skips documents whose size and mtime are unchanged, then those whose
+#      content hash is unchanged;
+#   2. extracts and chunks only the changed documents, in a process pool;
+#   3. embeds only chunks whose text hash is not already in the index, in
+#      batches, through any embedder with .name and .embed(texts);
+#   4. writes a new index version and swaps it in atomically (or writes
+#      nothing when no document changed).
+# The chunking settings are stored with the index; changing --max-words or
+# --overlap re-chunks every document.
+# Chunk embeddings are reused across documents and edits, so a nightly run
+# costs roughly the changed text, not the corpus.
+# -------------------------------------------------------------------
+
+document_types = (".pdf", ".docx", ".txt", ".md")
+
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------------------------
+# Extraction and chunking (runs in worker processes)
+# -------------------------------------------------------------------
+
+def extract_docx(path: str) -> str:
+    """Paragraph text of a .docx, read straight from its XML (no python-docx needed)."""
+    with zipfile.ZipFile(path) as docx:
+        root = ElementTree.fromstring(docx.read("word/document.xml"))
+    paragraphs = (
+        "".join(node.text or "" for node in p.iter(f"{WORD_NS}t"))
+        for p in root.iter(f"{WORD_NS}p")
+    )
+    return "\n\n".join(p for p in paragraphs if p.strip())
+
+
+def extract_pdf(path: str) -> str:
+    try:
+        from pypdf import PdfReader
+    except ImportError as exc:
+        raise RuntimeError("reading PDF files needs pypdf (pip install pypdf)") from exc
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+
+def extract_text(path: str) -> str:
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".docx":
+        return extract_docx(path)
+    if ext == ".pdf":
+        return extract_pdf(path)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def chunk_text(text: str, max_words: int = 200, overlap: int = 40) -> list[str]:
+    """
+    Word windows of at most max_words that start on paragraph boundaries
+    where possible; a paragraph longer than a window is split with
+    `overlap` words repeated between its pieces.
+    """
+    if max_words < 1 or not 0 <= overlap < max_words:
+        raise ValueError(f"need 0 <= overlap < max_words, got max_words={max_words}, overlap={overlap}")
+    chunks, current = [], []
+    for paragraph in re.split(r"\n\s*\n", text):
+        words = paragraph.split()
+        if not words:
+            continue
+        if current and len(current) + len(words) > max_words:
+            chunks.append(" ".join(current))
+            current = []
+        while len(words) > max_words:
+            chunks.append(" ".join(words[:max_words]))
+            words = words[max_words - overlap:]
+        current += words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+
+def process_document(path: str, doc_id: str, max_words: int, overlap: int) -> dict:
+    """
+    Hash, extract and chunk one document. Top-level so a process pool can
+    run it. A document that cannot be read comes back with an "error"
+    entry instead of raising, so one bad file does not stop the batch.
+    """
+    try:
+        stat = os.stat(path)
+        doc_hash = file_sha256(path)
+        chunks = chunk_text(extract_text(path), max_words, overlap)
+    except Exception as exc:
+        stat = os.stat(path) if os.path.exists(path) else None
+        return {
+            "doc_id": doc_id,
+            "doc_size": stat.st_size if stat else None,
+            "doc_mtime": stat.st_mtime_ns if stat else None,
+            "error": f"{type(exc).__name__}: {exc}",
+        }
+    return {
+        "doc_id": doc_id,
+        "doc_size": stat.st_size,
+        "doc_mtime": stat.st_mtime_ns,
+        "doc_hash": doc_hash,
+        "chunks": [
+            {
+                "chunk_id": f"{doc_id}#{i}",
+                "doc_id": doc_id,
+                "position": i,
+                "doc_size": stat.st_size,
+                "doc_mtime": stat.st_mtime_ns,
+                "doc_hash": doc_hash,
+                "chunk_hash": text_sha256(text),
+                "text": text,
+            }
+            for i, text in enumerate(chunks)
+        ],
+    }
+
+
+# -------------------------------------------------------------------
+# Refresh
+# -------------------------------------------------------------------
+
+def find_documents(source_dir: str) -> dict:
+    """doc_id (path relative to source_dir, '/'-separated) -> absolute path."""
+    found = {}
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if name.lower().endswith(document_types) and not name.startswith("~$"):
+                path = os.path.join(root, name)
+                found[os.path.relpath(path, source_dir).replace(os.sep, "/")] = path
+    return dict(sorted(found.items()))
+
+
+@contextmanager
+def index_lock(index_dir: str):
+    """One writer per index: a second refresh fails fast instead of racing."""
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, "LOCK")
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        raise RuntimeError(f"{index_dir} is being refreshed by another process ({path})") from None
+    try:
+        os.write(fd, str(os.getpid()).encode())
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+def embed_in_batches(embedder, texts: list[str], batch_size: int = 64) -> np.ndarray:
+    """float32 embeddings of texts, one embedder call per batch."""
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([
+        np.asarray(embedder.embed(texts[start:start + batch_size]), dtype=np.float32)
+        for start in range(0, len(texts), batch_size)
+    ])
+
+
+def embedding_blocks(sources, old_matrix, new_matrix, block_rows: int = 4096):
+    """
+    Yield the new index's embedding rows in blocks. sources[i] is
+    ("old", row) for a reused embedding or ("new", row) for a fresh one.
+    """
+    for start in range(0, len(sources), block_rows):
+        part = sources[start:start + block_rows]
+        block = np.empty((len(part), (new_matrix if len(new_matrix) else old_matrix).shape[1]), dtype=np.float32)
+        kinds = np.array([kind == "old" for kind, _ in part])
+        rows = np.array([row for _, row in part], dtype=np.int64)
+        if kinds.any():
+            # sorted reads keep the memory map sequential
+            old_rows = rows[kinds]
+            order = np.argsort(old_rows)
+            block[np.flatnonzero(kinds)[order]] = np.asarray(old_matrix[old_rows[order]])
+        if (~kinds).any():
+            block[~kinds] = new_matrix[rows[~kinds]]
+        yield block
+
+
+def refresh_index(source_dir: str, index_dir: str, embedder=None, workers: int | None = None,
+                  batch_size: int = 64, max_words: int = 200, overlap: int = 40) -> dict:
+    """
+    Bring the index in index_dir up to date with the documents under
+    source_dir. Returns a report of what was reused, re-chunked, embedded
+    and removed, with the live version afterwards. Documents that cannot
+    be read are listed in documents_failed (doc_id -> error) and keep the
+    chunks the index had for them.
+    """
+    embedder = embedder or HashingEmbedder()
+    chunking = {"max_words": max_words, "overlap": overlap}
+    chunk_text("", max_words, overlap)  # reject bad chunking before touching the index
+    start = time.perf_counter()
+    with index_lock(index_dir):
+        old = PolicyIndex.open(index_dir) if current_version(index_dir) else None
+        same_embedder = old is not None and old.meta["embedder"] == embedder.name
+        # other chunking settings: every document is re-chunked (embeddings of
+        # chunk texts that come out the same are still reused)
+        same_chunking = old is not None and old.meta.get("chunking") == chunking
+
+        # previous chunks per document, and reusable embeddings per chunk text
+        old_docs, old_rows = {}, {}
+        if old is not None:
+            for row, chunk in enumerate(old.chunks):
+                old_docs.setdefault(chunk["doc_id"], []).append(chunk)
+                if same_embedder:
+                    old_rows.setdefault(chunk["chunk_hash"], row)
+
+        # previous state per document, including documents without any chunks
+        manifest = old.meta.get("documents") if old is not None else {}
+        if manifest is None:
+            # index written before the manifest was stored: rebuild it from the chunks
+            manifest = {
+                doc_id: {"size": chunks[0]["doc_size"], "mtime": chunks[0]["doc_mtime"], "hash": chunks[0]["doc_hash"]}
+                for doc_id, chunks in old_docs.items()
+            }
+
+        documents = find_documents(source_dir)
+        unchanged, to_process, entries = {}, [], {}
+        for doc_id, path in documents.items():
+            entry = manifest.get(doc_id)
+            stat = os.stat(path)
+            if same_chunking and entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+                unchanged[doc_id] = old_docs.get(doc_id, [])
+                entries[doc_id] = entry
+            else:
+                to_process.append((doc_id, path))
+
+        processed, failed = {}, {}
+        if to_process:
+            with ProcessPoolExecutor(workers) as pool:
+                results = pool.map(
+                    process_document,
+                    [path for _, path in to_process], [doc_id for doc_id, _ in to_process],
+                    [max_words] * len(to_process), [overlap] * len(to_process),
+                    chunksize=max(1, len(to_process) // (4 * (workers or os.cpu_count() or 1))),
+                )
+                for result in results:
+                    doc_id, entry = result["doc_id"], manifest.get(result["doc_id"])
+                    if "error" in result:
+                        # keep whatever the index had for it; retried once the file changes
+                        failed[doc_id] = old_docs.get(doc_id, [])
+                        entries[doc_id] = {"size": result["doc_size"], "mtime": result["doc_mtime"],
+                                           "error": result["error"]}
+                        continue
+                    entries[doc_id] = {"size": result["doc_size"], "mtime": result["doc_mtime"], "hash": result["doc_hash"]}
+                    if same_chunking and entry and entry.get("hash") == result["doc_hash"]:
+                        # touched but identical: keep the old chunks, record the new mtime
+                        unchanged[doc_id] = [
+                            {**chunk, "doc_mtime": result["doc_mtime"]} for chunk in old_docs.get(doc_id, [])
+                        ]
+                    else:
+                        processed[doc_id] = result["chunks"]
+
+        removed = sorted(set(manifest) - set(documents))
+        touched_only = [doc_id for doc_id, _ in to_process if doc_id in unchanged]
+        report = {
+            "documents": len(documents),
+            "documents_unchanged": len(unchanged) - len(touched_only),
+            "documents_touched_only": len(touched_only),
+            "documents_changed": sum(doc_id in manifest for doc_id in processed),
+            "documents_added": sum(doc_id not in manifest for doc_id in processed),
+            "documents_removed": len(removed),
+            "chunking_changed": old is not None and not same_chunking,
+            "documents_failed": {doc_id: entry["error"] for doc_id, entry in entries.items() if "error" in entry},
+        }
+
+        if (old is not None and same_embedder and same_chunking
+                and not processed and not removed and not touched_only and not failed):
+            report.update(chunks=len(old), chunks_reused=len(old), chunks_embedded=0,
+                          version=current_version(index_dir), written=False,
+                          seconds=round(time.perf_counter() - start, 3))
+            return report
+
+        # new chunk list in document order; embed only unseen chunk texts
+        chunks, sources, new_texts, new_rows = [], [], [], {}
+        for doc_id in documents:
+            for chunk in unchanged.get(doc_id) or processed.get(doc_id) or failed.get(doc_id, []):
+                chunks.append(chunk)
+                if chunk["chunk_hash"] in old_rows:
+                    sources.append(("old", old_rows[chunk["chunk_hash"]]))
+                else:
+                    if chunk["chunk_hash"] not in new_rows:
+                        new_rows[chunk["chunk_hash"]] = len(new_texts)
+                        new_texts.append(chunk["text"])
+                    sources.append(("new", new_rows[chunk["chunk_hash"]]))
+
+        new_matrix = embed_in_batches(embedder, new_texts, batch_size)
+        old_matrix = old.embeddings if old is not None else np.zeros((0, 0), dtype=np.float32)
+        if chunks:
+            blocks = embedding_blocks(sources, old_matrix, new_matrix)
+        else:
+            blocks = [np.zeros((0, getattr(embedder, "dim", 0)), dtype=np.float32)]
+        version = write_index(index_dir, chunks, blocks, embedder_name=embedder.name,
+                              extra_meta={"chunking": chunking, "documents": entries})
+
+        report.update(chunks=len(chunks), chunks_reused=len(chunks) - sum(kind == "new" for kind, _ in sources),
+                      chunks_embedded=len(new_texts), version=version, written=True,
+                      seconds=round(time.perf_counter() - start, 3))
+        return report
+
+
+def main_cli(argv=None):
+    parser = argparse.ArgumentParser(description="Refresh the Policy Navigator retrieval index.")
+    parser.add_argument("source_dir", help="folder of .pdf / .docx / .txt / .md policy documents")
+    parser.add_argument("index_dir", help="index folder (created on first run)")
+    parser.add_argument("--workers", type=int, default=None, help="extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per embedding call")
+    parser.add_argument("--max-words", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=40)
+    parser.add_argument("--dim", type=int, default=384, help="dimension of the offline hashing embedder")
+    args = parser.parse_args(argv)
+    if args.max_words < 1 or not 0 <= args.overlap < args.max_words:
+        parser.error("--overlap must be at least 0 and less than --max-words")
+
+    report = refresh_index(
+        args.source_dir, args.index_dir, HashingEmbedder(args.dim),
+        workers=args.workers, batch_size=args.batch_size,
+        max_words=args.max_words, overlap=args.overlap,
+    )
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from matplotlib.figure import Figure
+
+# -------------------------------------------------------------------
+# Correlation analysis for wide tables
+#
+# Pearson correlations are computed block by block with float32 matrix
+# products (optionally on a row sample), so a few hundred numeric columns
+# need one k x k float32 matrix and no pandas pairwise loop. Missing
+# values are handled pairwise, as DataFrame.corr does.
+#
+#   corr = correlation_matrix(df, num_columns, sample_rows=200_000)
+#   pairs = top_correlations(corr, k=20)
+#   fig = correlation_heatmap(corr, threshold=0.3)
+# -------------------------------------------------------------------
+
+
+def standardized_values(df, columns):
+    """
+    float32 array of the columns, each centred and scaled by its own mean
+    and std so the block products below stay well conditioned in float32.
+    Missing values are NaN.
+    """
+    x = np.empty((len(df), len(columns)), dtype=np.float32)
+    for j, col in enumerate(columns):
+        values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+        values = np.where(np.isfinite(values), values, np.nan)
+        mean, std = np.nanmean(values), np.nanstd(values)
+        x[:, j] = (values - mean) / (std if std > 0 else 1.0)
+    return x
+
+
+def block_correlation(xa, ma, xb, mb):
+    """
+    Pairwise-complete Pearson correlation between the columns of two blocks.
+    xa / xb hold values with missing entries set to 0, ma / mb are 0/1
+    presence masks (all float32).
+    """
+    n = ma.T @ mb
+    sum_a = xa.T @ mb
+    sum_b = ma.T @ xb
+    sum_ab = xa.T @ xb
+    sum_aa = (xa * xa).T @ mb
+    sum_bb = ma.T @ (xb * xb)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = n * sum_ab - sum_a * sum_b
+        var = (n * sum_aa - sum_a * sum_a) * (n * sum_bb - sum_b * sum_b)
+        corr = cov / np.sqrt(var)
+    corr[(n < 2) | ~(var > 0)] = np.nan
+    return np.clip(corr, -1, 1)
+
+
+def correlation_matrix(df, columns=None, sample_rows=None, block_size=256, seed=0):
+    """
+    k x k float32 Pearson correlation DataFrame of the numeric columns.
+
+    sample_rows : use a random sample of at most this many rows
+    block_size  : columns per block; each block pair is one set of
+                  float32 matrix products
+    """
+    columns = list(df.columns if columns is None else columns)
+    if sample_rows is not None and len(df) > sample_rows:
+        df = df.sample(sample_rows, random_state=seed)
+    x = standardized_values(df, columns)
+    present = ~np.isnan(x)
+    complete = bool(present.all())
+    m = present.astype(np.float32)
+    x = np.where(present, x, np.float32(0))
+
+    k = len(columns)
+    corr = np.empty((k, k), dtype=np.float32)
+    for i in range(0, k, block_size):
+        a = slice(i, i + block_size)
+        for j in range(i, k, block_size):
+            b = slice(j, j + block_size)
+            if complete:
+                # no gaps: columns are already standardized over the same rows
+                block = np.clip(x[:, a].T @ x[:, b] / np.float32(len(x)), -1, 1)
+            else:
+                block = block_correlation(x[:, a], m[:, a], x[:, b], m[:, b])
+            corr[a, b] = block
+            corr[b, a] = block.T
+    np.fill_diagonal(corr, 1.0)
+    return pd.DataFrame(corr, index=columns, columns=columns)
+
+
+def top_correlations(corr, k=20, min_abs=0.0):
+    """The k column pairs with the largest |r| (each pair once)."""
+    values = corr.to_numpy()
+    rows, cols = np.triu_indices(len(values), k=1)
+    r = values[rows, cols]
+    strength = np.nan_to_num(np.abs(r), nan=-1.0)
+    keep = np.flatnonzero(strength >= min_abs)
+    if len(keep) > k:
+        keep = keep[np.argpartition(-strength[keep], k - 1)[:k]]
+    keep = keep[np.argsort(-strength[keep], kind="stable")]
+    return pd.DataFrame({
+        "Column A": corr.index[rows[keep]],
+        "Column B": corr.columns[cols[keep]],
+        "Correlation": r[keep].astype(np.float64),
+    }).reset_index(drop=True)
+
+
+def cluster_order(corr):
+    """
+    Column order that puts strongly correlated columns next to each other:
+    start from the most connected column and keep appending the unplaced
+    column most correlated with the last one placed (greedy seriation).
+    """
+    strength = np.nan_to_num(np.abs(corr.to_numpy(dtype=np.float64)), nan=0.0)
+    np.fill_diagonal(strength, 0.0)
+    if not len(strength):
+        return []
+    placed = np.zeros(len(strength), dtype=bool)
+    order = [int(strength.sum(axis=1).argmax())]
+    placed[order[0]] = True
+    for _ in range(len(strength) - 1):
+        candidates = np.where(placed, -1.0, strength[order[-1]])
+        nxt = int(candidates.argmax())
+        order.append(nxt)
+        placed[nxt] = True
+    return list(corr.index[order])
+
+
+def correlation_heatmap(corr, threshold=0.3, max_columns=60, annotate_up_to=20):
+    """
+    Clustered heatmap of the columns that have at least one |r| >= threshold
+    with another column (at most max_columns, strongest first); cells below
+    the threshold are left blank. Returns a matplotlib Figure, or None when
+    no pair reaches the threshold.
+    """
+    strength = np.abs(corr.to_numpy(dtype=np.float64))
+    np.fill_diagonal(strength, np.nan)
+    best = pd.Series(np.nanmax(np.nan_to_num(strength, nan=0.0), axis=1), index=corr.index)
+    keep = best[best >= threshold].sort_values(ascending=False).index[:max_columns]
+    if len(keep) < 2:
+        return None
+
+    sub = corr.loc[keep, keep]
+    order = cluster_order(sub)
+    sub = sub.loc[order, order].to_numpy(dtype=np.float64)
+    shown = np.where(np.abs(sub) >= threshold, sub, np.nan)
+
+    size = min(4 + 0.25 * len(order), 16)
+    fig = Figure(figsize=(size + 2, size))
+    ax = fig.subplots()
+    image = ax.imshow(shown, cmap="coolwarm", vmin=-1, vmax=1)
+    fig.colorbar(image, ax=ax, shrink=0.8)
+    ax.set_xticks(range(len(order)), order, rotation=90, fontsize="small")
+    ax.set_yticks(range(len(order)), order, fontsize="small")
+    if len(order) <= annotate_up_to:
+        for i, j in zip(*np.nonzero(~np.isnan(shown))):
+            ax.text(j, i, f"{shown[i, j]:.2f}", ha="center", va="center", fontsize="x-small")
+    ax.set_title(f"Correlations with |r| >= {threshold:g}")
+    return fig
@@ -0,0 +1,220 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import openai
+
+# -------------------------------------------------------------------
+# Prompt analysis over a data profile
+#
+# The model sees a compact description of the dataset built from the
+# profile tables (types, distinct counts, missing share, describe() stats,
+# top values, strongest correlations) cut to a token budget, not raw rows.
+# Finished answers are cached per (backend, dataset fingerprint, normalized
+# prompt) with LRU / TTL eviction, and answers are streamed as they arrive.
+# Backends only need a name and stream(messages); StubBackend answers
+# locally for tests and offline use.
+#
+#   analyzer = PromptAnalyzer(OpenAIBackend("gpt-4"))
+#   context = dataset_context(profile, correlation)
+#   for text in analyzer.stream(file_hash, context, "Which columns need cleaning?"):
+#       print(text, end="")
+# -------------------------------------------------------------------
+
+SYSTEM_PROMPT = (
+    "You are a data profiling assistant. The user message starts with a profile "
+    "of the whole dataset (not a sample); answer from it."
+)
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token for English and numbers)."""
+    return -(-len(text) // 4)
+
+
+def format_number(value):
+    return f"{value:,.0f}" if abs(value) >= 1000 or float(value).is_integer() else f"{value:.4g}"
+
+
+def column_line(row, statistics, top_values):
+    """One context line: name | type | distinct | missing | stats or top values."""
+    col = row["Feature"]
+    parts = [
+        str(col), str(row["Data Type"]),
+        f"{row['Number of Unique Values']:,} distinct", f"{row['Percentage Missing']:.0f}% missing",
+    ]
+    if col in statistics.columns:
+        stats = statistics[col]
+        parts.append(", ".join(
+            f"{name} {format_number(stats[name])}" for name in ("min", "mean", "50%", "max")
+            if name in stats.index and stats[name] == stats[name]
+        ))
+    elif col in top_values and top_values[col][0][1] > 1:
+        parts.append("top: " + ", ".join(f"{value} ({count:,})" for value, count in top_values[col]))
+    return " | ".join(parts)
+
+
+def dataset_context(profile, correlation=None, token_budget=1500):
+    """
+    Dataset description for the model from the profile dict of
+    dataprofile.profile_upload, within about token_budget tokens. Columns
+    that do not fit are counted but left out.
+    """
+    n_rows = profile["n_rows"]
+    summary = profile["summary"].merge(profile["missing"], left_on="Feature", right_on="Column")
+    statistics = profile["statistics"]
+    top_values = {
+        col: list(zip(group["value"], group["count"]))
+        for col, group in profile["top_values"].groupby("column", sort=False)
+    }
+
+    lines = [
+        f"Dataset: {n_rows:,} rows x {len(summary):,} columns.",
+        "Columns (name | type | distinct | missing | summary):",
+    ]
+    used = estimate_tokens("\n".join(lines))
+    shown = 0
+    for _, row in summary.iterrows():
+        line = column_line(row, statistics, top_values)
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        lines.append(line)
+        used += cost
+        shown += 1
+    if shown < len(summary):
+        lines.append(f"({len(summary) - shown:,} more columns not shown)")
+
+    if correlation is not None:
+        pairs = correlation["top_pairs"].head(5)
+        line = "Strongest correlations: " + "; ".join(
+            f"{a} ~ {b} r={r:.2f}" for a, b, r in pairs.itertuples(index=False)
+        )
+        if used + estimate_tokens(line) <= token_budget:
+            lines.append(line)
+    return "\n".join(lines)
+
+
+def normalize_prompt(prompt):
+    """Case and whitespace differences should not miss the cache."""
+    return " ".join(prompt.split()).casefold()
+
+
+class ResponseCache:
+    """Finished responses, least recently used evicted first and expired after ttl seconds."""
+
+    def __init__(self, max_entries=256, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.clock() - stored_at > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# -------------------------------------------------------------------
+# Backends
+# -------------------------------------------------------------------
+
+class OpenAIBackend:
+    """openai.ChatCompletion with stream=True."""
+
+    def __init__(self, model="gpt-4", temperature=0.3, max_tokens=1200):
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.name = f"openai:{model}"
+
+    def stream(self, messages):
+        response = openai.ChatCompletion.create(
+            model=self.model,
+            messages=messages,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        for chunk in response:
+            text = chunk["choices"][0]["delta"].get("content")
+            if text:
+                yield text
+
+
+class StubBackend:
+    """
+    Local stand-in model. Replies with reply (or a short echo of the
+    question), streamed word by word with delay seconds between words;
+    calls counts how often the model was actually asked.
+    """
+
+    name = "stub"
+
+    def __init__(self, reply=None, delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+
+    def stream(self, messages):
+        self.calls += 1
+        question = messages[-1]["content"].rsplit("\n\n", 1)[-1]
+        text = self.reply or f"(stub model) You asked: {question}"
+        for piece in re.findall(r"\S+\s*", text):
+            if self.delay:
+                time.sleep(self.delay)
+            yield piece
+
+
+# -------------------------------------------------------------------
+# Analyzer
+# -------------------------------------------------------------------
+
+class PromptAnalyzer:
+    """Streams answers about a dataset, serving repeated prompts from the cache."""
+
+    def __init__(self, backend, cache=None):
+        self.backend = backend
+        self.cache = cache if cache is not None else ResponseCache()
+
+    def messages(self, context, prompt):
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": f"{context}\n\n{prompt}"},
+        ]
+
+    def stream(self, fingerprint, context, prompt):
+        """
+        Yield the answer as text pieces. fingerprint identifies the dataset
+        the context was built from; only complete answers are cached.
+        """
+        key = (self.backend.name, fingerprint, normalize_prompt(prompt))
+        cached = self.cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        parts = []
+        for text in self.backend.stream(self.messages(context, prompt)):
+            parts.append(text)
+            yield text
+        self.cache.put(key, "".join(parts))
@@ -0,0 +1,450 @@
+import copy
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------
+# Single-pass column profiling for CSVs that do not fit in memory
+#
+# The file is read in chunks; every column keeps a small mergeable
+# sketch and each chunk is folded in once:
+#
+#   count / nulls / min / max / mean / std   exact in both modes
+#   distinct values                          exact: value set, approx: HyperLogLog
+#   quantiles (25/50/75%)                    exact: all values, approx: t-digest
+#   most frequent values                     exact: all counts, approx: Misra-Gries
+#
+# mode="exact" reproduces pandas (describe / nunique / value_counts) and
+# needs memory for the distinct values; mode="approx" needs a few KB per
+# column whatever the file size.
+#
+#   profile = profile_csv("big.csv", mode="approx")
+#   profile.statistics(), profile.summary(), profile.missing()
+# -------------------------------------------------------------------
+
+NUMERIC, BOOL, DATETIME, TEXT = "numeric", "bool", "datetime", "text"
+
+
+def column_kind(values):
+    dtype = values.dtype
+    if pd.api.types.is_bool_dtype(dtype):
+        return BOOL
+    if pd.api.types.is_numeric_dtype(dtype):
+        return NUMERIC
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return DATETIME
+    return TEXT
+
+
+def as_text(values):
+    """
+    Non-text chunk values as a single read_csv keeps them in an object
+    column: '5' rather than 5 or 5.0, 'True' rather than True; NaN stays NaN.
+    Whole floats are written as ints (ints in a chunk with blanks), so a
+    '5.0' in the file counts as '5'.
+    """
+    if pd.api.types.is_float_dtype(values.dtype):
+        x = values.to_numpy(dtype=np.float64, na_value=np.nan)
+        whole = np.isfinite(x) & (np.abs(x) < 2.0 ** 53) & (x == np.round(x))
+        text = x.astype(str).astype(object)
+        text[whole] = x[whole].astype(np.int64).astype(str)
+        text[np.isnan(x)] = np.nan
+        return pd.Series(text, index=values.index)
+    return values.astype(object).where(values.isna(), values.astype(str))
+
+
+# -------------------------------------------------------------------
+# HyperLogLog distinct count
+# -------------------------------------------------------------------
+
+def leading_zeros64(x):
+    """Leading zero bits of each uint64 (x > 0)."""
+    hi = (x >> np.uint64(32)).astype(np.float64)
+    lo = (x & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    with np.errstate(divide="ignore"):
+        clz_hi = 31 - np.floor(np.log2(hi))
+        clz_lo = 31 - np.floor(np.log2(lo))
+    return np.where(hi > 0, clz_hi, 32 + clz_lo).astype(np.int64)
+
+
+class HyperLogLog:
+    """HyperLogLog over 64-bit hashes with 2**precision registers."""
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        if not len(hashes):
+            return
+        p = np.uint64(self.precision)
+        index = (hashes >> (np.uint64(64) - p)).astype(np.int64)
+        rest = (hashes << p) | (np.uint64(1) << (p - np.uint64(1)))
+        rank = np.minimum(leading_zeros64(rest) + 1, 64 - self.precision + 1)
+        np.maximum.at(self.registers, index, rank.astype(np.uint8))
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int((self.registers == 0).sum())
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)   # small-range correction
+        return int(round(estimate))
+
+
+# -------------------------------------------------------------------
+# t-digest quantiles (merging variant, k1 scale)
+# -------------------------------------------------------------------
+
+class TDigest:
+    """Centroids (means, weights) that keep the distribution's tails sharp."""
+
+    def __init__(self, delta=200):
+        self.delta = delta
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def add_values(self, values):
+        self.add_centroids(values.astype(np.float64), np.ones(len(values)))
+
+    def merge(self, other):
+        self.add_centroids(other.means, other.weights)
+
+    def add_centroids(self, means, weights):
+        means = np.concatenate([self.means, means])
+        weights = np.concatenate([self.weights, weights])
+        if not len(means):
+            return
+        order = np.argsort(means, kind="mergesort")
+        means, weights = means[order], weights[order]
+        if len(means) <= self.delta:
+            # small enough to keep every point: quantiles stay exact
+            self.means, self.weights = means, weights
+            return
+
+        # points whose left quantile falls in the same unit of
+        # k(q) = delta / (2 pi) * asin(2q - 1) share a centroid
+        q_left = (np.cumsum(weights) - weights) / weights.sum()
+        k = self.delta / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        bucket = np.floor(k - k[0]).astype(np.int64)
+
+        new_weights = np.bincount(bucket, weights=weights)
+        new_means = np.bincount(bucket, weights=weights * means)
+        keep = new_weights > 0
+        self.weights = new_weights[keep]
+        self.means = new_means[keep] / self.weights
+
+    def quantile(self, q, lo, hi):
+        """Linear-interpolated quantile like np.quantile, within [lo, hi]."""
+        n = self.weights.sum()
+        if not n:
+            return np.nan
+        centers = np.cumsum(self.weights) - (self.weights + 1) / 2
+        positions = np.concatenate([[0.0], centers, [n - 1]])
+        values = np.concatenate([[lo], self.means, [hi]])
+        return float(np.interp(q * (n - 1), positions, values))
+
+
+# -------------------------------------------------------------------
+# Per-column sketch
+# -------------------------------------------------------------------
+
+class ColumnSketch:
+    """
+    Mergeable statistics of one column. update() folds in one chunk;
+    merge() combines sketches of two parts of the same column.
+    """
+
+    def __init__(self, mode="approx", top_k=10, precision=14, delta=200):
+        if mode not in ("exact", "approx"):
+            raise ValueError(f"mode must be 'exact' or 'approx', not {mode!r}")
+        self.mode = mode
+        self.top_k = top_k
+        self.kind = None
+        self.dtype = None
+        self.sample = None
+        self.has_sample = False
+        self.count = 0
+        self.nulls = 0
+        self.min = None
+        self.max = None
+        # Chan et al. running mean / sum of squared deviations
+        self.mean = 0.0
+        self.m2 = 0.0
+        # exact mode: all values / all distinct values / all counts
+        self.values = []
+        self.distinct = set() if mode == "exact" else HyperLogLog(precision)
+        self.distinct_numbers = np.empty(0)
+        self.digest = TDigest(delta)
+        # approx mode keeps at most this many counters (Misra-Gries)
+        self.capacity = max(10 * top_k, 100)
+        self.counts = pd.Series(dtype="float64")
+
+    # ---------------------------------------------------------------
+    def update(self, values):
+        if not self.has_sample and len(values):
+            self.sample = values.iloc[0]
+            self.has_sample = True
+
+        kind = column_kind(values)
+        self.set_kind(kind, values.dtype)
+        if self.kind == TEXT and kind != TEXT:
+            values = as_text(values)
+
+        present = values.dropna()
+        self.nulls += len(values) - len(present)
+        if not len(present):
+            return
+
+        if self.kind == NUMERIC:
+            x = present.to_numpy(dtype=np.float64)
+            self.add_moments(x)
+            self.add_range(x.min(), x.max())
+            if self.mode == "exact":
+                self.values.append(x)
+            else:
+                self.digest.add_values(x)
+        elif self.kind == DATETIME:
+            self.add_range(present.min(), present.max())
+        self.count += len(present)
+
+        self.add_distinct(present)
+        self.add_counts(present.value_counts(sort=False))
+
+    def set_kind(self, kind, dtype):
+        """
+        Settle the column type across chunks (like one read_csv would):
+        chunks of different kinds make the column text, and once text it
+        stays text; later non-text chunks are folded in as text.
+        """
+        if self.kind is None:
+            self.kind, self.dtype = kind, dtype
+        elif self.kind != kind and self.kind != TEXT:
+            self.to_text()
+        elif self.kind == NUMERIC and dtype != self.dtype:
+            # int chunks and float chunks (ints with NaN) -> float64
+            self.dtype = np.result_type(self.dtype, dtype)
+
+    def to_text(self):
+        """
+        The values seen so far are now text: drop the numeric / datetime
+        state and re-key the exact distinct set and the counts as text.
+        Approx mode keeps its HyperLogLog, so a value seen both as a number
+        and as text may be counted twice there.
+        """
+        if self.has_sample:
+            self.sample = as_text(pd.Series([self.sample])).iloc[0]
+        if self.mode == "exact":
+            self.distinct = set(as_text(pd.Series(list(self.distinct), dtype=object)))
+            self.distinct.update(as_text(pd.Series(self.distinct_numbers)))
+            self.distinct_numbers = np.empty(0)
+        if len(self.counts):
+            keys = as_text(self.counts.index.to_series(index=range(len(self.counts))))
+            self.counts = self.counts.groupby(keys.to_numpy(), sort=False).sum()
+        self.values, self.digest = [], TDigest(self.digest.delta)
+        self.mean = self.m2 = 0.0
+        self.min = self.max = None
+        self.kind, self.dtype = TEXT, np.dtype(object)
+
+    def add_moments(self, x):
+        n_a, n_b = self.count, len(x)
+        mean_b = x.mean()
+        m2_b = ((x - mean_b) ** 2).sum()
+        n = n_a + n_b
+        diff = mean_b - self.mean
+        self.mean += diff * n_b / n
+        self.m2 += m2_b + diff * diff * n_a * n_b / n
+
+    def add_range(self, lo, hi):
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+    def add_distinct(self, present):
+        if self.mode == "exact":
+            if self.kind == NUMERIC:
+                self.distinct_numbers = np.union1d(
+                    self.distinct_numbers, present.to_numpy(dtype=np.float64)
+                )
+            else:
+                self.distinct.update(pd.unique(present))
+        else:
+            self.distinct.add_hashes(pd.util.hash_array(present.to_numpy()))
+
+    def add_counts(self, counts):
+        counts = self.counts.add(counts.astype("float64"), fill_value=0)
+        if self.mode == "approx" and len(counts) > self.capacity:
+            # Misra-Gries: take the (capacity+1)-th count off everyone
+            cut = counts.nlargest(self.capacity + 1).iloc[-1]
+            counts = counts[counts > cut] - cut
+        self.counts = counts
+
+    # ---------------------------------------------------------------
+    def merge(self, other):
+        """Fold another sketch of the same column into this one."""
+        if other.kind is None:
+            return
+        if not self.has_sample:
+            self.sample, self.has_sample = other.sample, other.has_sample
+        self.set_kind(other.kind, other.dtype)
+        if self.kind == TEXT and other.kind != TEXT:
+            other = copy.copy(other)
+            other.to_text()
+        self.nulls += other.nulls
+        if self.kind == other.kind and self.kind in (NUMERIC, DATETIME) and other.count:
+            self.add_range(other.min, other.max)
+        if self.kind == NUMERIC and other.kind == NUMERIC and other.count:
+            n = self.count + other.count
+            diff = other.mean - self.mean
+            self.m2 += other.m2 + diff * diff * self.count * other.count / n
+            self.mean += diff * other.count / n
+            self.values += other.values
+            self.digest.merge(other.digest)
+        self.count += other.count
+        if self.mode == "exact":
+            self.distinct |= other.distinct
+            self.distinct_numbers = np.union1d(self.distinct_numbers, other.distinct_numbers)
+        else:
+            self.distinct.merge(other.distinct)
+        self.add_counts(other.counts)
+
+    # ---------------------------------------------------------------
+    def n_distinct(self):
+        if self.mode == "exact":
+            return len(self.distinct) + len(self.distinct_numbers)
+        # never more distinct values than non-null values seen
+        return min(self.distinct.estimate(), self.count)
+
+    def quantile(self, q):
+        if not self.count or self.kind != NUMERIC:
+            return np.nan
+        if self.mode == "exact":
+            return float(np.quantile(np.concatenate(self.values), q))
+        return self.digest.quantile(q, self.min, self.max)
+
+    def std(self):
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    def top(self, k=None):
+        """Most frequent values as (value, count) pairs; counts are lower bounds in approx mode."""
+        top = self.counts.sort_values(ascending=False, kind="mergesort").head(k or self.top_k)
+        return [(value, int(count)) for value, count in top.items()]
+
+
+# -------------------------------------------------------------------
+# Table profile
+# -------------------------------------------------------------------
+
+class TableProfile:
+    """Sketches of every column of one table, plus the row count."""
+
+    def __init__(self, mode="approx", top_k=10, precision=14, delta=200):
+        self.mode = mode
+        self.options = {"mode": mode, "top_k": top_k, "precision": precision, "delta": delta}
+        self.n_rows = 0
+        self.columns = {}
+
+    def update(self, chunk):
+        self.n_rows += len(chunk)
+        for col in chunk.columns:
+            if col not in self.columns:
+                self.columns[col] = ColumnSketch(**self.options)
+            self.columns[col].update(chunk[col])
+
+    def merge(self, other):
+        self.n_rows += other.n_rows
+        for col, sketch in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(sketch)
+            else:
+                self.columns[col] = sketch
+
+    def kinds(self):
+        """Column names per kind: {"numeric": [...], "text": [...], ...}."""
+        kinds = {NUMERIC: [], BOOL: [], DATETIME: [], TEXT: []}
+        for col, sketch in self.columns.items():
+            kinds[sketch.kind or TEXT].append(col)
+        return kinds
+
+    def nunique(self):
+        return pd.Series({col: s.n_distinct() for col, s in self.columns.items()}, dtype="int64")
+
+    def statistics(self):
+        """df.describe() from the sketches (numeric columns, else text ones)."""
+        numeric = [c for c, s in self.columns.items() if s.kind == NUMERIC]
+        if numeric:
+            rows = {}
+            for col in numeric:
+                s = self.columns[col]
+                rows[col] = {
+                    "count": float(s.count),
+                    "mean": s.mean if s.count else np.nan,
+                    "std": s.std(),
+                    "min": s.min if s.count else np.nan,
+                    "25%": s.quantile(0.25),
+                    "50%": s.quantile(0.5),
+                    "75%": s.quantile(0.75),
+                    "max": s.max if s.count else np.nan,
+                }
+            return pd.DataFrame(rows)
+
+        rows = {}
+        for col, s in self.columns.items():
+            top = s.top(1)
+            rows[col] = {
+                "count": s.count,
+                "unique": s.n_distinct(),
+                "top": top[0][0] if top else np.nan,
+                "freq": top[0][1] if top else np.nan,
+            }
+        return pd.DataFrame(rows, dtype=object)
+
+    def summary(self):
+        """The Summary sheet: type, distinct count, sample value, nulls."""
+        cols = list(self.columns)
+        return pd.DataFrame({
+            'Feature': cols,
+            'Data Type': [self.columns[c].dtype for c in cols],
+            'Number of Unique Values': [self.columns[c].n_distinct() for c in cols],
+            'Sample Value': [self.columns[c].sample for c in cols],
+            'Contains Nulls': [self.columns[c].nulls > 0 for c in cols],
+        })
+
+    def missing(self):
+        """The Null Values sheet."""
+        cols = list(self.columns)
+        missing_counts = np.array([self.columns[c].nulls for c in cols])
+        return pd.DataFrame({
+            'Column': cols,
+            'Missing Values': missing_counts,
+            'Not Missing Values': self.n_rows - missing_counts,
+            'Percentage Missing': missing_counts / self.n_rows * 100 if self.n_rows else np.nan,
+        })
+
+    def top_values(self, k=None):
+        """Most frequent values per column, long format (column, value, count)."""
+        rows = [
+            (col, value, count)
+            for col, s in self.columns.items()
+            for value, count in s.top(k)
+        ]
+        return pd.DataFrame(rows, columns=["column", "value", "count"])
+
+
+def profile_csv(source, mode="approx", chunksize=100_000, top_k=10,
+                precision=14, delta=200, **read_kwargs):
+    """
+    Profile a CSV (path or file-like) in one chunked pass.
+
+    mode="exact" matches pandas on the whole file; mode="approx" keeps
+    memory per column constant (HyperLogLog with 2**precision registers,
+    t-digest with compression delta, top_k heavy hitters). read_kwargs go
+    to pd.read_csv.
+    """
+    profile = TableProfile(mode, top_k, precision, delta)
+    for chunk in pd.read_csv(source, chunksize=chunksize, **read_kwargs):
+        profile.update(chunk)
+    return profile